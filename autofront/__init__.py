@@ -1,8 +1,40 @@
-import autofront.autofront as autofront
-import autofront.utilities as utilities
+""" autofront, the automatic front-end
 
-initialize = autofront.initialize
-add = autofront.add
-run = autofront.run
+Modules are only imported when one of their functions is first used,
+so worker processes don't load the server side of autofront.
+"""
+import importlib
+import sys
 
-get_display = utilities.get_display
+LAZY_FUNCTIONS = {'initialize' : 'autofront.autofront',
+                  'add' : 'autofront.autofront',
+                  'run' : 'autofront.autofront',
+                  'serve' : 'autofront.autofront',
+                  'create_wsgi_app' : 'autofront.autofront',
+                  'create_asgi_app' : 'autofront.autofront',
+                  'get_display' : 'autofront.utilities',
+                  'get_worker_stats' : 'autofront.multi',
+                  'get_queue_stats' : 'autofront.multi',
+                  'get_result_cache_info' : 'autofront.multi',
+                  'get_parse_cache_info' : 'autofront.parse'}
+
+SUBMODULES = ['asgi', 'autofront', 'config', 'debug', 'detect', 'input_utilities',
+              'multi', 'parse', 'records', 'utilities', 'views']
+
+def __getattr__(name):
+    """ Import functions and submodules on first use | str --> any """
+    if name in LAZY_FUNCTIONS:
+        value = getattr(importlib.import_module(LAZY_FUNCTIONS[name]), name)
+    elif name in SUBMODULES:
+        value = importlib.import_module('autofront.' + name)
+    else:
+        raise AttributeError("module 'autofront' has no attribute '{}'".format(name))
+    globals()[name] = value #Later lookups don't go through __getattr__
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(LAZY_FUNCTIONS) + SUBMODULES)
+
+if sys.version_info < (3, 7): #Module __getattr__ isn't supported, import everything now
+    for function_name in LAZY_FUNCTIONS:
+        __getattr__(function_name)
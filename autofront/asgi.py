@@ -0,0 +1,250 @@
+""" ASGI server for autofront
+
+This module lets asyncio servers such as uvicorn run autofront. Create your
+routes, then expose the app in your module::
+
+    app = autofront.create_asgi_app()
+
+and start it with::
+
+    uvicorn my_module:app
+
+Nothing waits in a thread: the display stream is woken up by print calls
+through add_display_listener, and input sessions wait for their next prompt
+with the event loop watching the input pipe. Every other request is quick
+and is handled by the Flask app (see views.py) in the event loop's default
+thread pool, so the pages are the same as with autofront.run.
+
+As with WSGI servers, the app must run in a single process.
+"""
+import asyncio
+import io
+import sys
+import urllib.parse
+from autofront.config import state as server_state
+from autofront.input_utilities import get_input_session, read_prompt, wait_for_prompt
+from autofront.multi import get_run_info
+from autofront.utilities import add_display_listener, remove_display_listener
+from autofront.utilities import wait_for_display
+from autofront.views import format_event, remove_private_entries
+
+STREAM_PATH = '/stream'
+
+INPUT_PATH = '/browser_input/'
+
+def create_app(wsgi_app):
+    """ Create an ASGI app running autofront | func --> func
+
+    wsgi_app is the Flask app created by autofront.initialize.
+    """
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await handle_lifespan(receive, send)
+            return
+        if scope['type'] != 'http': #Websockets are not used by autofront
+            return
+        if scope['path'] == STREAM_PATH:
+            await stream_display(scope, receive, send)
+            return
+        if scope['path'].startswith(INPUT_PATH):
+            await wait_for_prompt_async(scope['path'].rsplit('/', 1)[-1])
+        await call_wsgi_app(wsgi_app, scope, receive, send)
+    return app
+
+async def handle_lifespan(receive, send):
+    """ Answer server startup and shutdown messages | func, func --> None """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type':'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type':'lifespan.shutdown.complete'})
+            return
+
+async def wait_readable(connection, timeout=None):
+    """ Wait until a pipe can be read without blocking | Connection --> bool
+
+    Returns False if timeout is reached first.
+    """
+    if connection.poll():
+        return True
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    def set_readable():
+        if not readable.done():
+            readable.set_result(True)
+    fileno = connection.fileno() #Kept in case the session ends while waiting
+    try:
+        loop.add_reader(fileno, set_readable)
+    except NotImplementedError: #Windows event loops can't watch pipes
+        return await loop.run_in_executor(None, connection.poll, timeout)
+    try:
+        await asyncio.wait_for(readable, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fileno)
+
+async def wait_for_prompt_async(run_id):
+    """ Wait for the prompt expected by an input session, if any | str --> None
+
+    views.browser_input only asks for the prompt with expect_prompt when it
+    runs under this server, and it is read here before the next request of
+    the session is handled. See input_utilities.wait_for_prompt.
+    """
+    input_session = get_input_session(run_id)
+    if not input_session or input_session['prompt_timeout'] is None:
+        return
+    timeout = input_session['prompt_timeout'] or None #0 waits indefinitely
+    input_session['prompt_timeout'] = None
+    connection = input_session['connection']
+    if connection is None: #Worker was never started
+        wait_for_prompt(run_id)
+        return
+    read_prompt(run_id, await wait_readable(connection, timeout))
+
+async def wait_for_disconnect(receive):
+    """ Wait until the browser closes the connection | func --> None """
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+async def stream_display(scope, receive, send):
+    """ Stream print calls to the browser as Server-Sent Events
+
+    Same events as views.display_stream, without a thread per stream.
+    """
+    query = urllib.parse.parse_qs(scope['query_string'].decode('latin-1'))
+    headers = dict(scope['headers'])
+    since = headers.get(b'last-event-id', b'').decode('latin-1')
+    since = since or query.get('since', ['-1'])[0]
+    try:
+        since = int(since)
+    except ValueError:
+        since = -1
+    key = query.get('key', [None])[0]
+    loop = asyncio.get_running_loop()
+    printed = asyncio.Event()
+    def listener():
+        try:
+            loop.call_soon_threadsafe(printed.set)
+        except RuntimeError: #Event loop is closed
+            pass
+    add_display_listener(listener)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    async def send_text(text):
+        await send({'type':'http.response.body', 'body':text.encode(),
+                    'more_body':True})
+    try:
+        await send({'type':'http.response.start', 'status':200,
+                    'headers':[(b'content-type', b'text/event-stream; charset=utf-8'),
+                               (b'cache-control', b'no-cache'),
+                               (b'x-accel-buffering', b'no')]})
+        last_index = since
+        last_state = None
+        while not disconnect.done():
+            state = None
+            if key: #get_run_info can wait for the state lock
+                run_info = await loop.run_in_executor(None, get_run_info, key)
+                state = run_info['state'] if run_info else 'unknown'
+                if state != last_state:
+                    await send_text(format_event(state, event='state'))
+                    last_state = state
+            elif not await loop.run_in_executor(None, server_state.has_active_runs):
+                state = 'idle' #Nothing left to stream
+            ended = state not in [None, 'queued', 'running']
+            printed.clear()
+            entries = wait_for_display(last_index, key=key, timeout=0)
+            if not entries and not ended:
+                waiter = asyncio.ensure_future(printed.wait())
+                await asyncio.wait([waiter, disconnect], timeout=1,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                entries = wait_for_display(last_index, key=key, timeout=0)
+            if entries:
+                last_index = entries[-1][0]
+            if not key: #Print calls of input sessions stay private, as on the main page
+                entries = await loop.run_in_executor(None, remove_private_entries,
+                                                     entries)
+            for index, entry_key, text in entries:
+                await send_text(format_event({'key':entry_key, 'text':text},
+                                             event_id=index))
+            if ended:
+                await send_text(format_event(state, event='end'))
+                break
+            if not entries:
+                await send_text(': keep-alive\n\n')
+        await send({'type':'http.response.body', 'body':b'', 'more_body':False})
+    finally:
+        remove_display_listener(listener)
+        disconnect.cancel()
+
+def create_environ(scope, body):
+    """ Create the WSGI environ of an ASGI request | dict, bytes --> dict """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {'REQUEST_METHOD':scope['method'],
+               'SCRIPT_NAME':scope.get('root_path', ''),
+               'PATH_INFO':scope['path'].encode('utf-8').decode('latin-1'),
+               'QUERY_STRING':scope['query_string'].decode('latin-1'),
+               'SERVER_NAME':str(server[0]),
+               'SERVER_PORT':str(server[1]),
+               'SERVER_PROTOCOL':'HTTP/{}'.format(scope.get('http_version', '1.1')),
+               'REMOTE_ADDR':(scope.get('client') or ('', 0))[0],
+               'wsgi.version':(1, 0),
+               'wsgi.url_scheme':scope.get('scheme', 'http'),
+               'wsgi.input':io.BytesIO(body),
+               'wsgi.errors':sys.stderr,
+               'wsgi.multithread':True,
+               'wsgi.multiprocess':False,
+               'wsgi.run_once':False,
+               'autofront.asgi':True} #Lets views.prompt_wait leave waiting to us
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ['CONTENT_TYPE', 'CONTENT_LENGTH']:
+            environ[name] = value
+            continue
+        name = 'HTTP_' + name
+        if name in environ: #Repeated headers are joined, as in HTTP
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+def run_wsgi_app(wsgi_app, environ):
+    """ Get a WSGI app's response | func, dict --> str, list, bytes """
+    response = {}
+    chunks = []
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = headers
+        return chunks.append
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+async def call_wsgi_app(wsgi_app, scope, receive, send):
+    """ Handle an ASGI request with a WSGI app in a thread | func --> None """
+    body = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    environ = create_environ(scope, b''.join(body))
+    loop = asyncio.get_running_loop()
+    status, headers, body = await loop.run_in_executor(None, run_wsgi_app,
+                                                       wsgi_app, environ)
+    await send({'type':'http.response.start',
+                'status':int(status.split(' ', 1)[0]),
+                'headers':[(name.lower().encode('latin-1'), value.encode('latin-1'))
+                           for name, value in headers]})
+    await send({'type':'http.response.body', 'body':body})
@@ -32,15 +32,37 @@ To add a route with live args using type indications::
 
     autofront.add(my_function, live=True, typed=True)
 
+To add a route with live args converted using the function's type hints::
+
+    autofront.add(my_function, live=True, typed='signature')
+
 To add a second route to the same function or script::
     autofront.add(my_function, title = new_name)
 
 To add a route to a function or script meant to run in the background::
     autofront.add(my_function, join=False)
 
+To run a script inside an already running worker instead of a new process::
+    autofront.add('my_script.py', in_process=True)
+
+To limit the memory (in MB), CPU time and open files of a route (not on Windows)::
+    autofront.add(my_function, max_memory=500, max_cpu_seconds=10, max_open_files=100)
+
+To start a route first when calls are queued, at most two at a time::
+    autofront.add(my_function, priority=10, max_concurrent=2)
+
+To display the result of a previous call with the same args instead of calling again::
+    autofront.add(my_function, cache=True, cache_ttl=60)
+
+To serve autofront with a production server instead of the Flask server::
+    autofront.serve(threads=8)
+
+To serve autofront with an asyncio server such as uvicorn::
+    app = autofront.create_asgi_app()
+
 NOTE: Routes are not strictly speaking the same as Flask routes. Flask routes
-connect an actual URL to a view function. An autofront routes is simply
-a dictionary that contains the information autofront.functions needs
+connect an actual URL to a view function. An autofront route is simply
+a Route object (see records.py) that contains the information views.functions needs
 to know which function or script to trigger when the user selects
 its representation in the browser, as well as the options to run it properly.
 
@@ -51,6 +73,10 @@ the script kwarg::
 If your function doesn't use input calls, set join to True to speed it up::
     autofront.add(my_function, join=False)
 
+The Flask view functions are in views.py. Flask is only imported by
+autofront.initialize, so the worker processes running your functions
+and scripts start without loading it.
+
 You can configure certain options with autofront.initialize (see function docstring).
 This must be done before creating any routes, otherwise the server will be initialized
 automatically using default options.
@@ -59,142 +85,21 @@ See the autofront wiki at "https://github.com/JimmyLamothe/autofront/wiki"
 for more detailed information.
 """
 import multiprocessing
-from flask import Flask, redirect, render_template, request, url_for
-from autofront.config import config, status, print_config_dict
-from autofront.detect import detect_script, key_in_kwargs
-from autofront.input_utilities import clear_input, clear_prompt, get_input_args
-from autofront.input_utilities import get_input_kwargs, get_prompt
-from autofront.input_utilities import initialize_prompt, put_input_args
-from autofront.input_utilities import wait_for_prompt, write_input
-from autofront.multi import cleanup_workers, create_process
-from autofront.parse import TYPE_ERROR_MESSAGE
+import pathlib
+from autofront.config import config
+from autofront.multi import start_pool
+from autofront.records import Route
 from autofront.utilities import add_args_to_title, check_for_main, cleanup
-from autofront.utilities import clear_display, create_local_dir, create_local_script
-from autofront.utilities import get_display, get_fixed_args, get_function
-from autofront.utilities import get_live_args, get_local_ip, get_script_path, get_timeout
-from autofront.utilities import is_live, is_script, needs_input, print_exception
-from autofront.utilities import print_route_dicts, remove_args, set_main_process_pid
-from autofront.utilities import set_python_command, title_exists, typed_args
-from autofront.utilities import wait_to_join
+from autofront.utilities import clear_display, create_display_channel, create_local_dir
+from autofront.utilities import get_local_ip, set_main_process_pid, set_python_command
+from autofront.utilities import title_exists
 
 app = None # This will be a Flask server created by initialize().
 
-def functions():
-    """ Main page displaying all functions and their print calls """
-    #print_route_dicts() #Uncomment to check route dicts during development
-    #print_config_dict() #Uncomment to check config dict during devellopment
-    cleanup_workers() #Terminate any dead or potentially hanged processes
-    if request.method == 'POST':
-        status['request_received'] = True
-        status['request_completed'] = False
-        title = list(request.form.keys())[0] #Corresponds to 'input name' in HTML
-        join = wait_to_join(title)
-        timeout = get_timeout(title)
-        if is_script(title): #Path for scripts
-            script_path = get_script_path(title)
-            args = get_fixed_args(title)[0]
-            if is_live(title): #For scripts with args input in browser
-                live_args = get_live_args(request, script=True)
-                if live_args:
-                    args += live_args
-            if needs_input(title): #For scripts with input calls
-                initialize_prompt()
-                put_input_args(title, args)
-                return redirect(url_for('browser_input', title=title))
-            script_path = create_local_script(script_path)
-            print('Creating process for {}'.format(remove_args(title)))
-            create_process(script_path, *args, type='script', join=join,
-                           timeout=timeout)
-            return redirect(url_for('functions'))
-        function = get_function(title) #Path for function calls
-        fixed_args = get_fixed_args(title)
-        args = fixed_args[0]
-        kwargs = fixed_args[1]
-        if is_live(title): #For functions with args input in browser
-            typed = typed_args(title)
-            live_args = get_live_args(request, typed=typed)
-            if live_args[0] == 'Parsing Error':
-                print_exception(live_args[1])
-                display = get_display() + TYPE_ERROR_MESSAGE
-                status['request_completed'] = True
-                clear_display()
-                route_dicts = config['route_dicts']
-                top = config['top']
-                return render_template('functions.html', title='functions', top=top,
-                                       display=display, route_dicts=route_dicts)
-            if live_args[0]:
-                args += live_args[0]
-            kwargs.update(live_args[1])
-        if needs_input(title): #For functions that use input calls
-            initialize_prompt()
-            put_input_args(title, args, kwargs=kwargs)
-            return redirect(url_for('browser_input', title=title))
-        print('Creating process for {}'.format(remove_args(title)))
-        create_process(function, *args, type='function', join=join,
-                       timeout=timeout, **kwargs)
-    display = get_display()
-    clear_display()
-    route_dicts = config['route_dicts']
-    top = config['top']
-    return render_template('functions.html', title='functions', top=top,
-                           display=display, route_dicts=route_dicts)
-
-def browser_input(title):
-    """ Page to get input from user - run multiple times per script or function
-
-    Step 1: First run when input script or function has been detected.
-            Starts script or function.
-    Step 2: Run as many times as there are input calls - displays prompt
-            and gets input
-    Step 3: Run as many times as there are input calls - sends user input
-            to script or function and waits until it exits or timeouts
-            or there is another input call.
-    Step 4: Run when the function or script has terminated - returns
-            to the main page and displays final results if any.
-    """
-    display = get_display()
-    #Step 3 - Script or function running - Input received
-    if request.method == 'POST':
-        clear_display()
-        form_data = request.form
-        input_data = form_data['Input']
-        write_input(input_data)
-        wait_for_prompt(timeout=get_timeout(title))
-        return redirect(url_for('browser_input', title=title))
-    prompt = get_prompt()
-    #STEP 1 - Script or function not running - Launch it, get first prompt
-    if prompt == 'waiting for prompt':
-        clear_prompt()
-        clear_input()
-        timeout = get_timeout(title)
-        if is_script(title): #Script path
-            script_path = get_script_path(title)
-            args = get_input_args(title)
-            script_path = create_local_script(script_path)
-            print('creating process for {}'.format(remove_args(title)))
-            create_process(script_path, *args, type='input_script', join=False,
-                           timeout=timeout)
-            wait_for_prompt()
-            return redirect(url_for('browser_input', title=title))
-        function = get_function(title) #Function path
-        args = get_input_args(title)
-        kwargs = get_input_kwargs(title)
-        print('creating process for {}'.format(remove_args(title)))
-        create_process(function, *args, type='input_function', join=False,
-                       timeout=timeout, **kwargs)
-        wait_for_prompt()
-        return redirect(url_for('browser_input', title=title))
-    #STEP 4 - Script or function has finished running - Return to main page
-    if prompt in ['finished', 'timeout reached']:
-        return redirect(url_for('functions'))
-    #STEP 2 - Script or function running - get input in browser
-    if prompt == 'None':
-        prompt = ''
-    return render_template('web_input.html', title='get_input',
-                           display=display, prompt=prompt)
-
 def initialize(name=__name__, print_exceptions=True, template_folder=None,
-               static_folder=None, timeout=30, top=False, worker_limit=20):
+               static_folder=None, timeout=30, top=False, worker_limit=20,
+               pool_size=0, display_size=1000, python_command=None,
+               parse_cache_size=128, queue_size=100):
     """ Initialize the Flask app and clear the display. Running this after
     a route is added will raise an exception.
 
@@ -219,18 +124,48 @@ def initialize(name=__name__, print_exceptions=True, template_folder=None,
     The maximum amount of time a function or script can run is defined by timeout.
     Lowering these values can help speed up functionality in case a function or script
     doesn't finish properly.
+
+    Route calls above worker_limit wait in a run queue until a worker ends.
+    The queue_size kwarg sets how many calls can wait at once. Calls above it
+    are rejected with a message in the display. Set either to 0 for no limit.
+    Functions and scripts with input calls are never queued.
+
+    The pool_size kwarg lets you keep a number of workers ready in the background.
+    They import your route functions when the server starts, so clicking a route
+    doesn't have to wait for a new Python process to start. Scripts and functions
+    still run one at a time per worker, and a new process is created as usual
+    if all the pool workers are busy.
+
+    The display_size kwarg sets how many print calls are kept for each route
+    until the page is displayed. Older print calls are dropped first.
+
+    Scripts are run with the same Python interpreter as autofront. Use the
+    python_command kwarg to run them with a different one, for example
+    python_command='python3' or the path to a virtual environment's interpreter.
+
+    The parse_cache_size kwarg sets how many typed argument strings are kept
+    already parsed for routes with typed=True. Set it to 0 to disable the cache.
     """
     if not check_for_main():
         return
+    #Flask is only imported here, so worker processes never load it
+    from flask import Flask
+    from jinja2 import ChoiceLoader, FileSystemLoader
+    from autofront.views import register_views
     create_local_dir()
     cleanup()
     multiprocessing.set_start_method('spawn') #For consistency with 3.8 and Windows
     set_main_process_pid()
-    set_python_command()
+    set_python_command(python_command)
     config['print_exceptions'] = print_exceptions
     config['timeout'] = timeout
     config['top'] = top
     config['worker_limit'] = worker_limit
+    config['queue_size'] = queue_size
+    config['pool_size'] = pool_size
+    config['display_size'] = display_size
+    config['parse_cache_size'] = parse_cache_size
+    create_display_channel()
     clear_display()
     global app
     if template_folder and static_folder:
@@ -246,9 +181,11 @@ def initialize(name=__name__, print_exceptions=True, template_folder=None,
         print('Using custom static folder at {}'.format(str(static_folder)))
     else:
         app = Flask(name)
-    app.add_url_rule('/', 'functions', functions, methods=['GET', 'POST'])
-    app.add_url_rule('/browser_input/<title>', 'browser_input',
-                     browser_input, methods=['GET', 'POST'])
+    if template_folder: #Fall back on default templates missing from custom folder
+        default_templates = pathlib.Path(__file__).parent.joinpath('templates')
+        app.jinja_loader = ChoiceLoader([app.jinja_loader,
+                                         FileSystemLoader(str(default_templates))])
+    register_views(app)
 
 def initialize_default():
     """ Initializes the flask server with deault settings """
@@ -258,7 +195,10 @@ def initialize_default():
     initialize()
 
 def add(function_or_script_path, *args, live=False, timeout=None,
-                 title=None, typed=False, **kwargs):
+                 title=None, typed=False, in_process=False, max_memory=None,
+                 max_cpu_seconds=None, max_open_files=None, nice=None, priority=0,
+                 max_concurrent=None, cache=False, cache_ttl=None, cache_size=128,
+                 **kwargs):
     """ Create a new route to a function or script
 
     If you need to specify server options, this must be done with initialize before
@@ -289,15 +229,45 @@ def add(function_or_script_path, *args, live=False, timeout=None,
 
     Use typed=True to use type indications in your live args.
 
+    Use typed='signature' to convert live args with the type hints of your
+    function instead, so they can be input without type indications.
+
     Use script=True if detection fails to identify a script
 
+    Use in_process=True to run a script with runpy inside an already running
+    worker instead of starting a new Python process for every call. This is
+    much faster, especially in pool mode, but the script shares the worker with
+    other routes, so it should not change global state it doesn't clean up.
+
     Specify a timeout value (timeout=...) if a script of function hangs
     and needs to be stopped automatically.
+
+    Use max_memory (in MB), max_cpu_seconds and max_open_files to limit the
+    resources a function or script can use, and nice to lower its priority
+    (see os.nice). These routes always get a new worker, and a function or
+    script exceeding its limits is stopped. Memory includes the Python
+    interpreter itself and open files include the ones autofront uses.
+    Not supported on Windows.
+
+    Calls waiting in the run queue (see initialize) start in order of priority,
+    highest first. Use max_concurrent to limit how many calls to the route can
+    run at once. Other calls then wait in the queue, letting other routes run.
+
+    Use cache=True for functions that always give the same result for the same
+    args. Their print calls and return value, including any error message, are
+    kept and displayed again the next time the route is called with the same
+    args, without calling the function. Results expire after cache_ttl seconds
+    (None keeps them until they are pushed out) and the cache_size most recently
+    used results are kept.
+    Only functions without input calls can be cached, so join=True is implied.
     """
     if not check_for_main():
         return
+    from autofront.detect import detect_script, key_in_kwargs
     if not app:
         initialize_default()
+    if cache and not key_in_kwargs('join', **kwargs): #No input calls when cached
+        kwargs['join'] = True
     if not key_in_kwargs('script', **kwargs):
         script = detect_script(function_or_script_path)
     else:
@@ -327,32 +297,71 @@ def add(function_or_script_path, *args, live=False, timeout=None,
             del kwargs['join']
     if not title:
         title = name
-    if title_exists(title):
+    link = title
+    if live:
+        title = add_args_to_title(title, [*args], script=script)
+    if title_exists(link) or title_exists(title):
         message = 'A route with this title already exists.\n'
         message += 'Please specify a new title with the title kwarg.\n'
         message += "Example: autofront.add(my_function, title='new_title')\n"
         raise ValueError(message)
-    link = title
+    if cache and (script or not join):
+        message = 'Only functions with join=True can be cached.\n'
+        message += 'Remove the cache kwarg from scripts and functions meant to run '
+        message += 'in the background.\n'
+        raise ValueError(message)
     if not timeout:
         if join:
             timeout = config['timeout']
         else:
             timeout = None #These functions need to keep running in background
-    config['route_dicts'].append({'function':function, #None if script
-                                  'script':script, #True if script, False if function
-                                  'script_path':script_path, #None if function
-                                  'args':[*args],
-                                  'kwargs':{**kwargs},
-                                  'typed':typed,
-                                  'link':link,
-                                  'title':title,
-                                  'live':live,
-                                  'input':input_call,
-                                  'join':join,
-                                  'timeout':timeout})
-    if live:
-        config['route_dicts'][-1]['title'] = add_args_to_title(title, [*args],
-                                                               script=script)
+    schema = None
+    if typed == 'signature' and not script: #Read type hints only once
+        from autofront.parse import create_signature_schema
+        schema = create_signature_schema(function, fixed_arg_count=len(args))
+    limits = {key:value for key, value in [('max_memory', max_memory),
+                                           ('max_cpu_seconds', max_cpu_seconds),
+                                           ('max_open_files', max_open_files),
+                                           ('nice', nice)]
+              if value is not None}
+    route = Route(function=function, #None if script
+                  script=script, #True if script, False if function
+                  script_path=script_path, #None if function
+                  args=args,
+                  kwargs=kwargs,
+                  typed=typed,
+                  link=link,
+                  title=title,
+                  live=live,
+                  input=input_call,
+                  join=join,
+                  timeout=timeout,
+                  in_process=in_process and script,
+                  schema=schema,
+                  limits=limits or None,
+                  priority=priority,
+                  max_concurrent=max_concurrent,
+                  cache={'ttl':cache_ttl, 'size':cache_size} if cache else None)
+    config['routes'].append(route) #In display order
+    config['route_index'][title] = route #For lookups by title
+
+def print_server_address(port):
+    """ Print the addresses where the server can be reached | int --> None """
+    try:
+        local_ip = get_local_ip()
+        ip_port = local_ip + ':' + str(port)
+        print('\n')
+        print('Starting server. Access it from a local browser at '
+              'localhost:{}'.format(port))
+        print('or a browser on the same local network at {}'.format(ip_port))
+        print('\n')
+    except Exception: #General exception for safety since autofront can run anyway
+        print('\n')
+        print('Starting server. Access it from a local browser at '
+              'localhost:{}'.format(port))
+        print('or a browser on the same local network at your local IP '
+              'on port {}'.format(port))
+        print('\n')
 
 def run(host='0.0.0.0', port=5000):
     """ Starts the Flask server
@@ -364,21 +373,85 @@ def run(host='0.0.0.0', port=5000):
     Future versions of autofront should allow you to deploy your autofront app
     to cloud servers such as Python Anywhere, giving you similar functionality
     without putting you at risk.
+
+    Use autofront.serve instead to run autofront with a production server.
     """
     if not check_for_main():
         return
     if not app:
         raise RuntimeError('Routes must be created before starting server.')
-    try:
-        local_ip = get_local_ip()
-        ip_port = local_ip + ':' + str(port)
-        print('\n')
-        print('Starting server. Access it from a local browser at localhost:5000')
-        print('or a browser on the same local network at {}'.format(ip_port))
-        print('\n')
-    except Exception: #General exception for safety since autofront can run anyway
-        print('\n')
-        print('Starting server. Access it from a local browser at localhost:5000')
-        print('or a browser on the same local network at your local IP on port 5000')
-        print('\n')
+    print_server_address(port)
+    start_pool()
     app.run(host=host, port=port)
+
+def create_wsgi_app():
+    """ Get the autofront app for a WSGI server | None --> Flask
+
+    Use this instead of autofront.run to serve autofront with any WSGI server.
+    Create your routes, then expose the app in your module::
+
+        app = autofront.create_wsgi_app()
+
+    The app handles requests in several threads, but its workers, runs and
+    input sessions are stored in the server process, so the WSGI server must
+    use a single process. For example with gunicorn::
+
+        gunicorn --workers 1 --threads 8 my_module:app
+
+    Every open page following a run keeps one of these threads busy, see serve.
+
+    Returns None in worker processes.
+    """
+    if not check_for_main():
+        return None
+    if not app:
+        raise RuntimeError('Routes must be created before creating the WSGI app.')
+    start_pool()
+    return app
+
+def create_asgi_app():
+    """ Get the autofront app for an ASGI server | None --> func
+
+    Use this to serve autofront with an asyncio server such as uvicorn.
+    Create your routes, then expose the app in your module::
+
+        app = autofront.create_asgi_app()
+
+    Streams and input sessions wait on the event loop instead of keeping
+    a thread busy, so many of them can be open at the same time. As with
+    create_wsgi_app, the server must use a single process::
+
+        uvicorn my_module:app
+
+    Returns None in worker processes.
+    """
+    if not check_for_main():
+        return None
+    from autofront.asgi import create_app
+    return create_app(create_wsgi_app())
+
+def serve(host='0.0.0.0', port=5000, threads=8):
+    """ Starts autofront with a production server
+
+    Uses waitress if it is installed (pip install waitress), with the number
+    of threads set by the threads kwarg. Otherwise falls back on the threaded
+    Flask server.
+
+    Every open page following a run keeps one thread busy to stream its print
+    calls: the run page until its run is over, and the main page while runs
+    are queued or running. Requests wait when all threads are busy, so use
+    more threads than the number of browsers you expect to follow runs at once,
+    or use create_asgi_app, where streams don't keep a thread busy.
+    """
+    if not check_for_main():
+        return
+    wsgi_app = create_wsgi_app()
+    try:
+        import waitress
+    except ImportError:
+        print('waitress is not installed, using the Flask server instead')
+        print_server_address(port)
+        wsgi_app.run(host=host, port=port, threaded=True)
+        return
+    print_server_address(port)
+    waitress.serve(wsgi_app, host=host, port=port, threads=threads)
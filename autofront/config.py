@@ -1,34 +1,53 @@
 """ Configuration module
 
-This module contains all the route dictionaries created with autofront.add
+This module contains all the routes created with autofront.add
 as well as general configuration parameters. Most of the configuration parameters
 can be modified when initializing the server using kwargs with autofront.initialize.
 
 'print_exceptions' displays most route exceptions in the browser instead of the console
-'route_dicts' stores all the route dictionaries created with autofront.add
+'routes' stores all the routes created with autofront.add (see records.py)
+'route_index' stores the same routes by title for fast lookups
 'top' specifies whether to print route results at the top or bottom of the display
 'timeout' determines the default timeout value for workers in case they hang
-'worker_limit' sets a maximum number of active workers above which autofront assumes
-a bug has occured and multi.cleanup_workers can eliminate the oldest workers.
+'worker_limit' sets a maximum number of active workers. Runs above it wait in the
+run queue until a worker ends (see multi.dispatch_runs). 0 disables it.
+'queue_size' sets how many runs can wait in the run queue. Runs above it are rejected.
+0 disables it.
+'pool_size' sets the number of pre-spawned workers kept ready to run routes.
+Set to 0 to start a new process for every route call.
+'display_size' sets how many print calls are kept for each route in the display.
+'run_history' sets how many ended runs can still be checked at /runs/<run_id>.
+'parse_cache_size' sets how many parsed typed argument strings are kept. 0 disables it.
+'python_command' is the interpreter used to run scripts. None uses the interpreter
+running autofront (sys.executable).
+
+'state' stores the workers, runs and run statuses shared by the server threads
+(see records.ServerState).
 
 The default values defined here should match the default values of the
 autofront.initialize kwargs, but this is only for clarity when reading the code.
 The values specified here will be overridden when autofront.initialize is executed,
 either by the default kwargs or the ones specified by the user.
 """
+from autofront.records import ServerState
 
 config = {'print_exceptions':True,
-          'route_dicts':[],
+          'routes':[],
+          'route_index':{},
           'top':False,
           'timeout':30,
-          'worker_limit':20}
+          'worker_limit':20,
+          'queue_size':100,
+          'pool_size':0,
+          'display_size':1000,
+          'run_history':100,
+          'parse_cache_size':128,
+          'python_command':None}
 
-status = {'request_received':False,
-          'waiting':False,
-          'request_completed':False}
+state = ServerState()
 
 def print_config_dict():
     """prints config dict | None --> None"""
     for key, value in config.items():
-        if not key == 'route_dicts':
+        if key not in ['routes', 'route_index']:
             print('{0} = {1}'.format(key, str(value)))
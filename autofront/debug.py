@@ -5,6 +5,10 @@ Activate debug_mode to print to console.
 Activate step_mode to pause execution at every function return call
 
 Presently only enabled for parsing module.
+
+When debug mode is off, debug_manager returns the function itself, so
+decorated functions run without any extra cost. debug_mode swaps the
+functions and their debugging versions in their module when it's toggled.
 """
 
 import functools
@@ -13,30 +17,50 @@ debug = False
 
 step = False
 
+debugged_functions = [] #(module globals, name, function, debugging version)
+
 def debug_mode():
     """ Activates debug mode """
     global debug
     debug = not debug
+    rebind_functions()
 
 def step_mode():
     """ Activates step mode """
     global step
     step = not step
 
+def rebind_functions():
+    """ Use debugging versions of functions only in debug mode | None --> None
+
+    Replaces the functions in their module and in module level dicts
+    such as parse.PARSING_FUNCTIONS.
+    """
+    for module_globals, name, func, wrapper in debugged_functions:
+        old, new = (func, wrapper) if debug else (wrapper, func)
+        if module_globals.get(name) is old:
+            module_globals[name] = new
+        for value in list(module_globals.values()):
+            if isinstance(value, dict):
+                for key, item in value.items():
+                    if item is old:
+                        value[key] = new
+
 def debug_manager(func):
     """ Decorator. Allows easy debugging """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        if debug:
-            print('Entering: ' + func.__name__)
-            print('Args: ' + str(args))
-            print('Kwargs: ' + str(kwargs))
-            wrapped_func = func(*args, **kwargs)
-            print('Exiting: ' + func.__name__)
-            print('Return: ' + str(wrapped_func))
-            print('Return type: ' + str(type(wrapped_func)))
-            if step:
-                input('Press RETURN to continue')
-            return wrapped_func
-        return func(*args, **kwargs)
-    return wrapper
+        print('Entering: ' + func.__name__)
+        print('Args: ' + str(args))
+        print('Kwargs: ' + str(kwargs))
+        wrapped_func = func(*args, **kwargs)
+        print('Exiting: ' + func.__name__)
+        print('Return: ' + str(wrapped_func))
+        print('Return type: ' + str(type(wrapped_func)))
+        if step:
+            input('Press RETURN to continue')
+        return wrapped_func
+    debugged_functions.append((func.__globals__, func.__name__, func, wrapper))
+    if debug:
+        return wrapper
+    return func
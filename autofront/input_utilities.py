@@ -2,152 +2,206 @@
 
 The builtin input function needs to be replaced to get input in the browser instead
 of in the console. This module enables this functionality. Since the server and
-the function or script are running in separate processes, they communicate by writing
-to the prompt.txt and input.txt files.
+the function or script are running in separate processes, they communicate through
+a pipe created for each input route call by multi.create_process.
 
-When an input script or function is detected, autofront.browser_input starts
-the process and waits for the prompt file to be written.
+Each input route call is an input session with its own run id, pipe, prompt
+and args, so several browsers can run input routes at the same time.
+
+When an input script or function is detected, views.functions creates
+a session and views.browser_input starts the process and waits for
+the prompt to be sent through the pipe.
 
 web_input replaces the builtin input function inside the process.
-It writes the prompt to the prompt file and waits for input.
+It sends the prompt through the pipe and waits for input.
+
+views.browser_input gets the prompt and gets user input in the browser.
+It sends the input through the pipe.
 
-autofront.browser_input reads the prompt file and gets user input in the browser.
-It writes the input to the input file.
+web_input receives the input and returns it.
 
-web_input reads the input from the input file and returns it.
+Scripts run in a subprocess that can't use the pipe. Their web_input writes
+the prompt to stdout with PROMPT_MARKER and reads the input from stdin.
+The worker running the script relays both with relay_input.
 
 redirect_input is a decorator enabling functions to be run with web_input instead
 of the builtin input function.
 """
 
 import functools
-import time
-from autofront.utilities import get_local_path, get_route_dict, has_key
-from autofront.utilities import exception_manager
+import sys
+import threading
+from autofront.config import state
+from autofront.utilities import exception_manager, write_display
+
+PROMPT_MARKER = '**AUTOFRONT_PROMPT**'
+
+input_channel = None #Worker end of the input pipe
+
+input_sessions = {}
+""" Input_session keys, sessions are stored by run id:
+'title': title of the route being run
+'args': args for the function or script
+'kwargs': kwargs for the function
+'connection': main process end of the input pipe, None until the worker starts
+'prompt': last prompt received
+'lock': held by views.browser_input while it handles a request for the session
+'prompt_timeout': timeout of a prompt to wait for before the next request is
+handled, None if there is none (see expect_prompt)
+"""
 
-def initialize_prompt():
-    """ Initialize prompt file on script start | None --> None """
-    with open(get_local_path().joinpath('prompt.txt'), 'w') as prompt_file:
-        prompt_file.write('waiting for prompt')
+def create_input_session(title, args, kwargs=None):
+    """ Create a new input session for a route | str, list, dict --> str
 
-def get_prompt():
-    """ Get contents of prompt text file | None --> str """
-    with open(get_local_path().joinpath('prompt.txt'), 'r') as prompt_file:
-        return prompt_file.read()
+    Every call to a route with input calls gets its own session, so
+    several users can run input routes at the same time. Returns the run id
+    used to identify the session in the browser_input URL.
+    """
+    import secrets
+    run_id = secrets.token_hex(8)
+    input_sessions[run_id] = {'title':title,
+                              'args':args,
+                              'kwargs':kwargs or {},
+                              'connection':None,
+                              'prompt':'waiting for prompt',
+                              'lock':threading.Lock(),
+                              'prompt_timeout':None}
+    state.set_run_status(run_id, state.INPUT) #Its print calls stay off the main page
+    return run_id
+
+def get_input_session(run_id):
+    """ Get input session, None if it doesn't exist | str --> dict """
+    return input_sessions.get(run_id)
+
+def end_input_session(run_id):
+    """ Close input pipe and delete session | str --> None """
+    input_session = input_sessions.pop(run_id, None)
+    state.set_run_status(run_id, None)
+    if input_session and input_session['connection']:
+        input_session['connection'].close()
+
+def set_input_connection(run_id, connection):
+    """ Set main process end of the input pipe | str, Connection --> None """
+    input_sessions[run_id]['connection'] = connection
+
+def set_input_channel(channel):
+    """ Set worker end of the input pipe | Connection --> None """
+    global input_channel
+    input_channel = channel
+
+def get_prompt(run_id):
+    """ Get last prompt received | str --> str """
+    return input_sessions[run_id]['prompt']
 
 def write_prompt(string):
-    """ Write string to prompt text file | str --> None """
-    with open(get_local_path().joinpath('prompt.txt'), 'w') as prompt_file:
-        prompt_file.write(string)
-
-def clear_prompt():
-    """ Clear prompt text file | None --> None """
-    with open(get_local_path().joinpath('prompt.txt'), 'w'):
+    """ Send prompt to the main process | str --> None """
+    try:
+        input_channel.send(string)
+    except (BrokenPipeError, OSError): #Main process stopped waiting for it
         pass
 
-def initialize_input():
-    """ Initialize input file on script start | None --> None """
-    with open(get_local_path().joinpath('input.txt'), 'w') as input_file:
-        input_file.write('waiting for input')
-
-def get_input():
-    """ Get contents of input text file | None --> str """
-    with open(get_local_path().joinpath('input.txt'), 'r') as input_file:
-        return input_file.read()
-
-def write_input(string):
-    """ Write string to input text file | str --> None """
-    with open(get_local_path().joinpath('input.txt'), 'w') as input_file:
-        if string:
-            input_file.write(string)
-        else:
-            input_file.write('**BLANK_INPUT_RECEIVED**')
-
-def clear_input():
-    """ Clear input text file | None --> None """
-    with open(get_local_path().joinpath('input.txt'), 'w'):
+def clear_prompt(run_id):
+    """ Clear prompt | str --> None """
+    input_sessions[run_id]['prompt'] = ''
+
+def write_input(run_id, string):
+    """ Send user input to the worker | str, str --> None """
+    try:
+        input_sessions[run_id]['connection'].send(string)
+    except (AttributeError, BrokenPipeError, OSError): #Worker has exited
         pass
 
-def put_input_args(title, args, kwargs=None):
-    """ Store args for function with input call | str, dict --> None
+def get_input_args(run_id):
+    """ Get args for a script or function with input calls | str --> list """
+    return input_sessions[run_id]['args']
 
-    Temporarily stores the args for a script using input calls in the route dict.
-    Will be deleted when script has finished execution.
-    """
-    route_dict = get_route_dict(title)
-    route_dict['input_args'] = args
-    if kwargs:
-        route_dict['input_kwargs'] = kwargs
-
-def get_input_args(title):
-    """ Get args for a script with input calls | str, dict --> list """
-    route_dict = get_route_dict(title)
-    input_args = route_dict['input_args']
-    return input_args
-
-def get_input_kwargs(title):
-    """ get kwargs for a script with input calls | str, dict --> dict """
-    if has_key(title, 'input_kwargs'):
-        route_dict = get_route_dict(title)
-        return route_dict['input_kwargs']
-    return {}
-
-def wait_for_prompt(timeout=0):
-    """ Wait for prompt file to be written | None --> None
+def get_input_kwargs(run_id):
+    """ Get kwargs for a function with input calls | str --> dict """
+    return input_sessions[run_id]['kwargs']
+
+def wait_for_prompt(run_id, timeout=0):
+    """ Wait for the worker to send a prompt | str --> None
 
         If script does not end after seconds specified in 'timeout' kwarg,
-        will write 'timeout reached' to prompt file.
+        the prompt will be 'timeout reached'. A timeout of 0 waits indefinitely.
+        If the worker exits without sending anything, the prompt will be 'finished'.
     """
-    clear_prompt()
-    prompt_received = False
-    time_waited = 0
-    while not prompt_received or time_waited > timeout:
-        with open(get_local_path().joinpath('prompt.txt'), 'r') as prompt_file:
-            contents = prompt_file.read()
-            if time_waited > timeout:
-                write_prompt('timeout reached')
-                break
-            if not contents:
-                print('Waiting_for_prompt')
-                time.sleep(1)
-                if timeout: #if timeout 0, time_waited will never increase
-                    time_waited += 1
-            else:
-                print('Prompt received')
-                prompt_received = True
+    input_session = input_sessions[run_id]
+    connection = input_session['connection']
+    if connection is None: #Worker was never started
+        input_session['prompt'] = 'finished'
+        return
+    if not timeout:
+        timeout = None
+    read_prompt(run_id, connection.poll(timeout))
+
+def read_prompt(run_id, ready):
+    """ Read the prompt sent by the worker, if ready | str, bool --> None """
+    input_session = input_sessions.get(run_id)
+    if not input_session: #Ended by multi.cleanup_workers while waiting
+        return
+    if not ready:
+        input_session['prompt'] = 'timeout reached'
+        return
+    try:
+        input_session['prompt'] = input_session['connection'].recv()
+        print('Prompt received')
+    except (EOFError, OSError): #Worker exited or was killed, or session ended
+        input_session['prompt'] = 'finished'
+
+def expect_prompt(run_id, timeout=0):
+    """ Wait for the prompt before the next request instead of now | str --> None
+
+    Used by the ASGI server, which waits for the prompt without blocking
+    before passing the next request of the session to browser_input.
+    See wait_for_prompt for the timeout kwarg.
+    """
+    input_sessions[run_id]['prompt_timeout'] = timeout
 
 def wait_for_input():
-    """ Wait for input file to be written, then returns contents | None --> str """
-    clear_input()
-    input_received = False
-    while not input_received:
-        with open(get_local_path().joinpath('input.txt'), 'r') as input_file:
-            contents = input_file.read()
-            if not contents:
-                time.sleep(1)
-            else:
-                return contents
+    """ Wait for the main process to send input, then return it | None --> str """
+    return input_channel.recv()
 
 def web_input(*args):
     """ Replaces the built-in input function for browser input | str --> str
 
-    Writes input prompt to prompt file to activate browser_input.
-    autofront.browser_input gets user input in browser and writes to input file.
-    Reads input file and returns contents.
+    Sends input prompt to the main process to activate browser_input.
+    views.browser_input gets user input in browser and sends it back.
+    Inside a script subprocess, prompt and input go through stdout and stdin.
     """
+    import json
     if args:
         prompt = [*args][0]
     else:
         prompt = 'None'
-    clear_input()
-    input_received = False
-    with open(get_local_path().joinpath('prompt.txt'), 'w') as prompt_file:
-        prompt_file.write(prompt)
-    while not input_received:
-        input_received = wait_for_input() #Returns contents when received
-    if input_received == '**BLANK_INPUT_RECEIVED**':
-        return ''
-    return input_received
+    if input_channel is None: #Script subprocess, see relay_input
+        sys.stdout.write(PROMPT_MARKER + json.dumps(str(prompt)) + '\n')
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line:
+            raise EOFError('No input received')
+        return line[:-1] if line.endswith('\n') else line
+    write_prompt(str(prompt))
+    return wait_for_input()
+
+def relay_input(line, script):
+    """ Relay a script's input call to the browser | str, Popen --> bool
+
+    Returns False if the line printed by the script was not a prompt.
+    Text printed before the prompt on the same line, like a print call
+    with end='' followed by input(), is sent to the display first.
+    """
+    import json
+    marker_index = line.find(PROMPT_MARKER)
+    if marker_index == -1:
+        return False
+    if marker_index:
+        write_display(line[:marker_index])
+    prompt = json.loads(line[marker_index + len(PROMPT_MARKER):])
+    write_prompt(prompt)
+    script.stdin.write(wait_for_input() + '\n')
+    script.stdin.flush()
+    return True
 
 def redirect_input(func):
     """ Decorator to divert input calls to the browser | func --> func"""
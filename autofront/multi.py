@@ -2,40 +2,114 @@
 This module is used to create workers that run the scripts and functions specified
 with autofront.add using the multiprocessing module. There are different
 workers for running scripts, regular functions, scripts that use input calls
-and functions that use input calls.
+and functions that use input calls. Scripts can run in a subprocess or inside
+the worker itself with runpy (in_process routes).
 
-'worker_dicts' stores all worker dictionaries
+Workers, pool workers and runs are stored in config.state (see records.ServerState):
+'state.worker_records' stores a WorkerRecord for every worker (see records.py)
+'state.pool_dicts' stores the pre-spawned pool workers when pool mode is active
+'state.run_dicts' stores every route call made from the main page by run id
 'create_process' is the main function used to create workers.
-'cleanup_workers' removes dead workers from worker_dicts and any workers above
-the worker limit value set in config.py.
+'submit_run' queues a route call and returns its run id without waiting.
+'dispatch_runs' starts queued runs by priority while the worker limit allows it.
+'cleanup_workers' removes dead workers from state.worker_records and kills workers
+past their timeout. Workers stopped by the resource limits of their route
+(see apply_limits) are reported there as well, and the input sessions of
+ended workers are ended.
+It runs in the reaper thread, which wakes up when a worker ends or reaches
+its deadline, so requests never wait for it.
+'kill_workers' stops workers with SIGTERM, then SIGKILL if they don't exit in time.
+'get_worker_stats' counts running workers and how ended workers were reaped.
+'get_queue_stats' gives the depth of the run queue and how long runs waited.
+'result_caches' keeps the output of runs of cached routes, see get_cached_output.
 'info', 'kill' and 'kill_all'  are used for testing purposes during development.
+
+The server can handle several requests at once in separate threads, so the
+functions changing the state are decorated with synchronized.
 """
 
+import atexit
+import bisect
+import collections
+import functools
+import heapq
+import importlib
+import itertools
 import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import threading
 import time
-from autofront.config import config, status
-from autofront.input_utilities import redirect_input, write_prompt
+from autofront.config import config, state
+from autofront.input_utilities import end_input_session, get_input_session
+from autofront.input_utilities import redirect_input, relay_input
+from autofront.input_utilities import set_input_channel, web_input, write_prompt
+from autofront.records import WorkerRecord
+from autofront.utilities import forget_display, get_display_history, get_display_output
+from autofront.utilities import get_exceeded_limit, get_python_command
 from autofront.utilities import print_return_value, print_to_display
-from autofront.utilities import redirect_print, wrap_script
+from autofront.utilities import redirect_print, remove_args, set_display_channel
+from autofront.utilities import track_display, wrap_script, wrap_script_in_process
+from autofront.utilities import write_display
+import autofront.utilities as utilities
 
-worker_dicts = []
-""" Worker_dict keys:
-'worker': process - this is the actual worker
-'start_time': process start time
-'timeout': maximum allowed running time. Set to None if no timeout limit.
-"""
+REAPER_INTERVAL = 5 #Longest time in seconds between two cleanups
+
+TERMINATE_GRACE = 1 #Time in seconds workers get to exit before being killed
+
+LIMIT_EXIT_CODES = {'max_memory':121, #Exit codes of workers stopped by a limit
+                    'max_cpu_seconds':122,
+                    'max_open_files':123}
+
+reaper = None #Thread running reap_workers, started with the first worker
+
+reaper_wakeup = None #(reader, writer) socket pair used to wake up the reaper
+
+deadline_count = itertools.count() #Orders deadlines reached at the same time
+
+run_count = itertools.count() #Orders queued runs with the same priority
+
+result_caches = {} #Route title --> OrderedDict of args hash --> (store time, output)
+
+result_cache_info = {'hits':0, 'misses':0}
 
-def script_worker(script_path, *args):
+stopping = False #Set on exit so the reaper doesn't replace the pool workers
+
+def synchronized(func):
+    """ Decorator. Run function while holding the state lock """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with state.lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+def script_worker(script_path, *args, python_command=None):
     """ Process target for scripts | func, args, kwargs --> None """
-    wrapped_script = wrap_script(script_path, *args)
+    wrapped_script = wrap_script(script_path, *args, python_command=python_command)
     wrapped_script()
 
-def input_script_worker(script_path, *args):
+def input_script_worker(script_path, *args, python_command=None):
     """ Process target for input scripts | func, args, kwargs --> None """
-    wrapped_script = wrap_script(script_path, *args)
+    wrapped_script = wrap_script(script_path, *args, relay=relay_input,
+                                 python_command=python_command)
     wrapped_script()
     write_prompt('finished')
 
+def in_process_script_worker(script_path, *args):
+    """ Process target for scripts run with runpy | func, args, kwargs --> None """
+    wrapped_script = wrap_script_in_process(script_path, *args)
+    wrapped_script()
+
+def in_process_input_script_worker(script_path, *args):
+    """ Process target for input scripts run with runpy | func, args, kwargs --> None """
+    wrapped_script = wrap_script_in_process(script_path, *args, input_function=web_input)
+    try:
+        wrapped_script()
+    finally:
+        write_prompt('finished')
+
 @redirect_print
 def function_worker(function, *args, **kwargs):
     """ Process target for regular functions | func, args, kwargs --> None """
@@ -47,149 +121,941 @@ def input_function_worker(function, *args, **kwargs):
     """ Process target for input functions | func, args, kwargs --> None """
     print_return_value(function(*args, **kwargs))
 
-def get_running_time(worker_dict):
-    """ How long a worker has been running | dict --> float """
+def channel_worker(channel, input_channel, key, limits, target, *args, **kwargs):
+    """ Process target for new processes | tuple, Connection, str, dict, func --> None
+
+    Connects the worker to the display and to the input pipe if the route
+    has input calls, and applies the route's resource limits if any, before
+    running the actual target. A worker stopped by a limit exits with its code
+    in LIMIT_EXIT_CODES so the main process can report it.
+    """
+    start_process_group()
+    set_display_channel(channel, key)
+    set_input_channel(input_channel)
+    if limits:
+        apply_limits(limits)
+    try:
+        target(*args, **kwargs)
+    except Exception as e:
+        limit = get_exceeded_limit(e)
+        if not limit:
+            raise
+        sys.exit(LIMIT_EXIT_CODES[limit])
+
+def apply_limits(limits):
+    """ Apply the resource limits and nice value of a route | dict --> None
+
+    Script subprocesses inherit them. The CPU time used to start the worker
+    doesn't count, and a worker still running one second after its CPU limit
+    gets SIGXCPU is killed by the system.
+    """
+    try:
+        import resource
+    except ImportError: #Windows
+        print('Resource limits are not supported on this system')
+        return
+    if limits.get('nice'):
+        os.nice(limits['nice'])
+    if limits.get('max_memory'):
+        set_limit(resource.RLIMIT_AS, int(limits['max_memory'] * 1024 * 1024))
+    if limits.get('max_cpu_seconds'):
+        import math
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        seconds = math.ceil(usage.ru_utime + usage.ru_stime + limits['max_cpu_seconds'])
+        set_limit(resource.RLIMIT_CPU, seconds, seconds + 1)
+    if limits.get('max_open_files'):
+        set_limit(resource.RLIMIT_NOFILE, limits['max_open_files'])
+    utilities.resource_limits = limits
+
+def set_limit(limit, soft, hard=None):
+    """ Lower a resource limit of the worker | int, int, int --> None
+
+    Limits can't be raised above the current hard limit.
+    """
+    import resource
+    if hard is None:
+        hard = soft
+    current_hard = resource.getrlimit(limit)[1]
+    if current_hard != resource.RLIM_INFINITY:
+        soft = min(soft, current_hard)
+        hard = min(hard, current_hard)
+    resource.setrlimit(limit, (soft, hard))
+
+def start_process_group():
+    """ Make the worker the leader of a new process group | None --> None
+
+    Script subprocesses and anything else the worker starts join its group,
+    so kill_workers can stop all of them at once. Ctrl+C in the terminal then
+    only reaches the main process, which stops the workers when it exits.
+    Process groups don't exist on Windows.
+    """
+    if hasattr(os, 'setpgid'):
+        os.setpgid(0, 0)
+
+def pool_worker(connection, modules, channel):
+    """ Process target for pool workers | Connection, [str], tuple --> None
+
+    Imports the modules containing the route functions, then runs every job
+    received through the connection until the pipe is closed. A job is a tuple
+    of target, route title, input pipe, args and kwargs, where target is one
+    of the workers above. The input pipe is None for routes without input calls.
+    """
+    start_process_group()
+    set_display_channel(channel, None)
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            print('Pool worker could not import {}'.format(module))
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError: #Main process has exited
+            break
+        if job is None: #Sent by stop_pool
+            break
+        target, key, input_channel, args, kwargs = job
+        set_display_channel(channel, key)
+        set_input_channel(input_channel)
+        try:
+            target(*args, **kwargs)
+        except Exception: #Keep worker alive, print like a regular process would
+            import traceback
+            traceback.print_exc()
+        if input_channel:
+            input_channel.close() #Lets the main process know the job is over
+            set_input_channel(None)
+        connection.send('done')
+
+def get_route_modules():
+    """ Modules containing route functions | None --> [str]
+
+    '__main__' is left out since spawn already imports it in every worker.
+    """
+    modules = []
+    for route in config['routes']:
+        function = route.function
+        if function is None:
+            continue
+        module = getattr(function, '__module__', None)
+        if module and module != '__main__' and module not in modules:
+            modules.append(module)
+    return modules
+
+def create_pool_worker(modules):
+    """ Start a new pool worker and add it to state.pool_dicts | [str] --> dict
+
+    Pool_dict keys:
+    'worker': process - a pre-spawned worker waiting for jobs
+    'connection': parent end of the pipe used to send jobs and receive results
+    'job': WorkerRecord of the job currently running, None if worker is idle
+    'stopping': True once the worker is being killed, it gets no more jobs
+    """
+    connection, worker_connection = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=pool_worker, name='pool_worker',
+                                     args=(worker_connection, modules,
+                                           utilities.display_channel))
+    worker.start()
+    pool_dict = {'worker':worker,
+                 'connection':connection,
+                 'job':None,
+                 'stopping':False}
+    state.pool_dicts.append(pool_dict)
+    return pool_dict
+
+@synchronized
+def start_pool():
+    """ Pre-spawn workers up to the pool size set in config | None --> None
+
+    Called by autofront.run once all routes have been added, so the workers
+    can import every route function before the first job arrives.
+    """
+    pool_size = config['pool_size']
+    if not pool_size or len(state.pool_dicts) >= pool_size:
+        return
+    modules = get_route_modules()
+    while len(state.pool_dicts) < pool_size:
+        create_pool_worker(modules)
+    print('Worker pool started with {} workers'.format(str(pool_size)))
+
+@synchronized
+def refill_pool():
+    """ Replace dead or killed pool workers | None --> None """
+    if stopping or not state.pool_dicts:
+        return
+    state.pool_dicts[:] = [pool_dict for pool_dict in state.pool_dicts
+                           if pool_dict['worker'].is_alive()
+                           and not pool_dict['stopping']]
+    start_pool()
+
+@atexit.register
+def stop_pool():
+    """ Stop the workers so the main process can exit | None --> None
+
+    Pool workers are asked to exit, then every worker still running is
+    stopped with kill_workers, along with the processes it started.
+    """
+    global stopping
+    with state.lock:
+        stopping = True
+    for pool_dict in state.pool_dicts:
+        try:
+            pool_dict['connection'].send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for pool_dict in state.pool_dicts:
+        pool_dict['worker'].join(timeout=1)
+    workers = [pool_dict['worker'] for pool_dict in state.pool_dicts]
+    workers += [worker_record.worker for worker_record in state.worker_records
+                if not worker_record.pool_dict]
+    workers = [worker for worker in workers if worker.is_alive()]
+    if workers:
+        kill_workers(workers)
+
+def update_pool_dict(pool_dict):
+    """ Mark pool worker as idle if its job is done | dict --> None """
+    if pool_dict['job'] is None:
+        return
+    try:
+        if pool_dict['connection'].poll():
+            pool_dict['connection'].recv()
+            pool_dict['job'] = None
+    except (EOFError, OSError): #Worker was killed
+        pool_dict['job'] = None
+
+@synchronized
+def get_idle_pool_dict():
+    """ Get an idle pool worker if any | None --> dict or None """
+    for pool_dict in state.pool_dicts:
+        update_pool_dict(pool_dict)
+        if pool_dict['stopping']: #Timed out, killed outside the state lock
+            continue
+        if pool_dict['job'] is None and pool_dict['worker'].is_alive():
+            return pool_dict
+    return None
+
+def get_running_time(worker_record):
+    """ How long a worker has been running | WorkerRecord --> float """
     current_time = time.time()
-    start_time = worker_dict['start_time']
+    start_time = worker_record.start_time
     running_time = current_time - start_time
     return running_time
 
-def create_process(function_or_script_path, *args, type=None, join=True,
-                   timeout=None, **kwargs):
-    """ Main function used to create workers | func, args, kwargs --> None
+@synchronized
+def create_process(function_or_script_path, *args, type=None, timeout=None,
+                   route_title=None, limits=None, **kwargs):
+    """ Main function used to create workers | func, args, kwargs --> WorkerRecord
 
     Creates a worker (multiprocessing.Process object) and starts it. This is how
     all routes actually run functions.
 
     'type' should always be specified and determines which function to target
 
-    Set 'join' to False if function needs to keep running in background.
-    This is automatic for functions using input calls.
+    'route_title' identifies the route, run or input session in the display
 
-    In this case, a worker_dict will be created with the actual worker,
-    start_time and timeout values and stored in worker_dicts.
-    The worker will keep running until function ends normally or timeout expires.
+    A WorkerRecord will be created with the actual worker, start_time and
+    timeout values and stored in state.worker_records, then returned. The worker will
+    keep running until function ends normally or timeout expires.
+    This never waits for the worker to finish, see submit_run for that.
 
     If a function or script is hanging, the timeout kwarg can be used
     to force stop it and allow the server to keep running.
+
+    'limits' are the resource limits of the route (see apply_limits).
+
+    In pool mode, the job is sent to an idle pre-spawned worker instead.
+    A new process is only created if all pool workers are busy, or if the
+    route has limits, since they can't be removed from a worker once applied.
     """
-    if status['waiting']:
-        print('Waiting for route to finish execution, ignoring user input')
-        return
     type_dict = {'script':script_worker,
                  'input_script':input_script_worker,
+                 'in_process_script':in_process_script_worker,
+                 'in_process_input_script':in_process_input_script_worker,
                  'function':function_worker,
                  'input_function':input_function_worker}
     target = type_dict[type] #Get correct function for process type
-    if type in ['script', 'input_script']:
+    if type in ['script', 'input_script', 'in_process_script',
+                'in_process_input_script']:
         script_path = function_or_script_path
         name = script_path.name
         args = tuple([script_path] + list(args))
+        if type in ['script', 'input_script']: #Workers don't share config
+            kwargs['python_command'] = get_python_command()
     else:
         function = function_or_script_path
         name = function.__name__
         args = tuple([function] + list(args))
+    input_channel = None
+    if type in ['input_script', 'in_process_input_script', 'input_function']:
+        input_connection, input_channel = multiprocessing.Pipe()
     start_time = time.time()
-    worker = multiprocessing.Process(target=target, name=name, args=args,
-                                     kwargs=kwargs)
-    worker.start()
-    worker_dict = {'worker':worker,
-                   'start_time':start_time,
-                   'timeout':timeout}
-    worker_dicts.append(worker_dict)
-    if join: #For normal functions that need to finish running
-        print('Waiting for {} to finish'.format(worker.name))
-        status['waiting'] = True
-        worker.join(timeout=timeout)
-        if worker.is_alive():
-            print('{} timed out, killing process'.format(worker.name))
-            error_message = '{} timed out before completion.\n'.format(worker.name)
-            error_message += 'You can change the timeout value with a kwarg:\n'
-            error_message += 'autofront.add(my_function, '
-            error_message += 'timeout=value_in_seconds)'
-            if config['print_exceptions']:
-                print_to_display(error_message)
-            else:
-                print(error_message)
-            kill(worker)
-        else:
-            print('{} finished normally'.format(worker.name))
-        status['waiting'] = False
-    status['request_completed'] = True
-
-def is_alive(worker_dict):
-    """ Test if worker is alive and running | None --> Bool """
-    return worker_dict['worker'].is_alive()
-
-def timeout_expired(worker_dict):
-    """ Test if timeout value has been reached | None --> Bool """
-    timeout = worker_dict['timeout']
+    if config['pool_size'] and not state.pool_dicts:
+        start_pool()
+    pool_dict = None if limits else get_idle_pool_dict()
+    if pool_dict:
+        worker = pool_dict['worker']
+        job = (target, route_title, input_channel, args, kwargs)
+        pool_dict['connection'].send(job)
+    else:
+        args = (utilities.display_channel, input_channel, route_title, limits,
+                target) + args
+        worker = multiprocessing.Process(target=channel_worker, name=name,
+                                         args=args, kwargs=kwargs)
+        worker.start()
+    if input_channel:
+        input_channel.close() #Worker has its own copy now
+    worker_record = WorkerRecord(worker, name, start_time, timeout=timeout,
+                                 pool_dict=pool_dict, limits=limits)
+    if pool_dict:
+        pool_dict['job'] = worker_record
+    if input_channel:
+        worker_record.input_connection = input_connection
+    state.worker_records.append(worker_record)
     if timeout:
-        return get_running_time(worker_dict) > worker_dict['timeout']
-    return False
+        deadline = (start_time + timeout, next(deadline_count), worker_record)
+        heapq.heappush(state.deadlines, deadline)
+    start_reaper()
+    wake_reaper() #Watch the new worker
+    return worker_record
+
+@synchronized
+def submit_run(function_or_script_path, *args, type=None, join=True, timeout=None,
+               route_title=None, limits=None, priority=0, max_concurrent=None,
+               cache=None, **kwargs):
+    """ Queue a route call and start it if possible | func, args, kwargs --> str
+
+    Returns immediately with the run id. The run starts when dispatch_runs
+    picks it, as soon as the worker limit set in config allows it. Its state,
+    running time and print calls can then be checked with get_run_info.
+    If the queue is already full, the run is rejected instead.
+
+    'cache' is the result cache setting of the route. If a previous run with
+    the same args is cached, its output is displayed again and the run is
+    finished right away without a worker (see get_cached_output).
+
+    Set 'join' to False if function needs to keep running in background.
+    Timeouts are only reported in the display for runs with join=True.
+
+    Run_dict keys, runs are stored by run id in state.run_dicts:
+    'title': title of the route
+    'state': 'queued', 'running', 'finished', 'timed out', 'limit exceeded',
+    'rejected' or 'failed' (its worker could not be started)
+    'join': False for runs meant to keep running in the background
+    'priority': runs with a higher priority leave the queue first
+    'max_concurrent': maximum running runs of the route, None if no maximum
+    'submit_time': time the route was called
+    'start_time': time the worker was started, None while queued
+    'end_time': time the run was found to be over, None until then
+    'job': create_process args while queued, None once started
+    'worker_record': WorkerRecord once started
+    'cache': result cache setting of the route, None if not cached
+    'cache_key': hash of the args used to store the output, None if not cached
+    'cached': True if the output was displayed from the cache
+    """
+    import secrets
+    prune_runs()
+    run_id = secrets.token_hex(8)
+    cache_key = get_cache_key(args, kwargs) if cache else None
+    state.run_dicts[run_id] = {'title':route_title,
+                               'state':'queued',
+                               'join':join,
+                               'priority':priority,
+                               'max_concurrent':max_concurrent,
+                               'submit_time':time.time(),
+                               'start_time':None,
+                               'end_time':None,
+                               'job':(function_or_script_path, args, type, timeout,
+                                      limits, kwargs),
+                               'worker_record':None,
+                               'cache':cache,
+                               'cache_key':cache_key,
+                               'cached':False}
+    track_display(run_id)
+    output = get_cached_output(route_title, cache_key, cache) if cache_key else None
+    if output is not None:
+        replay_run(run_id, output)
+        return run_id
+    queue_size = config['queue_size']
+    if queue_size and len(state.pending_runs) >= queue_size:
+        reject_run(run_id)
+        return run_id
+    state.set_run_status(run_id, state.RECEIVED)
+    bisect.insort(state.pending_runs, (-priority, next(run_count), run_id))
+    dispatch_runs()
+    return run_id
+
+def reject_run(run_id):
+    """ End a run that can't be queued and say so | str --> None """
+    run_dict = state.run_dicts[run_id]
+    run_dict['state'] = 'rejected'
+    run_dict['end_time'] = time.time()
+    run_dict['job'] = None
+    title = remove_args(run_dict['title'])
+    print('Run queue is full, rejecting run {0} of {1}'.format(run_id, title))
+    error_message = '{} was not started, too many calls are waiting.\n'.format(title)
+    error_message += 'You can change the queue size with a kwarg:\n'
+    error_message += 'autofront.initialize(queue_size=value)'
+    print_to_display(error_message, key=run_id)
+
+def fail_run(run_id, error):
+    """ End a run whose worker could not be started | str, Exception --> None """
+    run_dict = state.run_dicts[run_id]
+    run_dict['job'] = None
+    end_run(run_id, 'failed')
+    title = remove_args(run_dict['title'])
+    print('Could not start run {0} of {1}: {2!r}'.format(run_id, title, error))
+    error_message = '{} could not be started.\n'.format(title)
+    error_message += '{0}: {1}'.format(error.__class__.__name__, error)
+    print_to_display(error_message, key=run_id)
+
+def replay_run(run_id, output):
+    """ Finish a run by displaying cached output | str, str --> None """
+    run_dict = state.run_dicts[run_id]
+    run_dict['state'] = 'finished'
+    run_dict['end_time'] = time.time()
+    run_dict['job'] = None
+    run_dict['cached'] = True
+    title = remove_args(run_dict['title'])
+    print('Using cached result for run {0} of {1}'.format(run_id, title))
+    write_display(output, key=run_id)
+
+def get_cache_key(args, kwargs):
+    """ Hash of the args and kwargs of a run | list, dict --> str
+
+    Returns None if they can't be pickled, since they couldn't be sent
+    to a worker either.
+    """
+    import hashlib
+    import pickle
+    try:
+        data = pickle.dumps((list(args), sorted(kwargs.items())), protocol=4)
+    except Exception: #Pickling can raise almost anything
+        return None
+    return hashlib.sha256(data).hexdigest()
+
+def get_cached_output(title, cache_key, cache):
+    """ Get cached output of a route for a hash, None if none | str, str, dict --> str
 
-def timeout_okay(worker_dict):
-    """ Tests if timeout value has not been reached yet | None --> Bool """
-    return not timeout_expired(worker_dict)
+    Results older than the route's cache ttl are removed instead.
+    """
+    result_cache = result_caches.get(title)
+    result = result_cache.get(cache_key) if result_cache else None
+    if result and cache['ttl'] is not None and time.time() - result[0] > cache['ttl']:
+        del result_cache[cache_key]
+        result = None
+    if result is None:
+        result_cache_info['misses'] += 1
+        return None
+    result_cache.move_to_end(cache_key)
+    result_cache_info['hits'] += 1
+    return result[1]
+
+def cache_output(run_id, run_dict):
+    """ Keep the output of a finished run of a cached route | str, dict --> None
+
+    Runs that didn't end normally or lost print calls aren't cached.
+    The least recently used results above the route's cache size are removed.
+    """
+    worker_record = run_dict['worker_record']
+    if worker_record.pool_dict:
+        ended_normally = worker_record.worker.is_alive() #Pool worker is ready for more
+    else:
+        ended_normally = worker_record.worker.exitcode == 0
+    output = get_display_output(run_id)
+    if not ended_normally or output is None:
+        return
+    result_cache = result_caches.setdefault(run_dict['title'],
+                                            collections.OrderedDict())
+    result_cache[run_dict['cache_key']] = (time.time(), output)
+    result_cache.move_to_end(run_dict['cache_key'])
+    while len(result_cache) > run_dict['cache']['size']:
+        result_cache.popitem(last=False)
+
+@synchronized
+def get_result_cache_info():
+    """ Get result cache hits, misses and size | None --> dict """
+    return {'hits':result_cache_info['hits'],
+            'misses':result_cache_info['misses'],
+            'size':sum([len(result_cache) for result_cache in result_caches.values()])}
+
+@synchronized
+def clear_result_cache():
+    """ Empty result cache and reset its counters | None --> None """
+    result_caches.clear()
+    result_cache_info['hits'] = 0
+    result_cache_info['misses'] = 0
+
+@synchronized
+def get_running_counts():
+    """ Number of running runs of each route | None --> Counter """
+    return collections.Counter([run_dict['title'] for run_dict in state.run_dicts.values()
+                                if update_run(run_dict) == 'running'])
+
+def select_run(running_counts):
+    """ Pick the next queued run to start, None if none can | Counter --> tuple
+
+    Runs with the highest priority go first, skipping routes already running
+    max_concurrent times. Among runs with the same priority, the route with
+    the fewest running runs goes first, so a route called many times in a row
+    doesn't keep the others waiting. Then the oldest run goes first.
+    """
+    selected = None
+    selected_running = None
+    for entry in state.pending_runs: #Sorted by priority, then order
+        if selected and entry[0] > selected[0]: #Lower priority
+            break
+        run_dict = state.run_dicts[entry[2]]
+        running = running_counts[run_dict['title']]
+        max_concurrent = run_dict['max_concurrent']
+        if max_concurrent and running >= max_concurrent:
+            continue
+        if not selected or running < selected_running:
+            selected = entry
+            selected_running = running
+    return selected
+
+@synchronized
+def dispatch_runs():
+    """ Start queued runs while the worker limit allows it | None --> None
+
+    Every live worker counts toward the limit, including input sessions and
+    runs in the background. Runs left in the queue start when a worker ends,
+    see cleanup_workers. A run whose worker can't be started, for example
+    because its args can't be pickled, fails without stopping the others.
+    """
+    if not state.pending_runs:
+        return
+    limit = config['worker_limit']
+    active = len([worker_record for worker_record in state.worker_records
+                  if is_alive(worker_record)])
+    running_counts = get_running_counts()
+    while state.pending_runs:
+        if limit and active >= limit:
+            break
+        entry = select_run(running_counts)
+        if not entry: #Every queued route is running max_concurrent times
+            break
+        state.pending_runs.remove(entry)
+        run_id = entry[2]
+        run_dict = state.run_dicts[run_id]
+        function_or_script_path, args, type, timeout, limits, kwargs = run_dict['job']
+        print('Starting run {0} of {1}'.format(run_id, remove_args(run_dict['title'])))
+        try:
+            worker_record = create_process(function_or_script_path, *args, type=type,
+                                           timeout=timeout, route_title=run_id,
+                                           limits=limits, **kwargs)
+        except Exception as error: #Unpicklable args, too many open files...
+            fail_run(run_id, error)
+            continue
+        worker_record.run_id = run_id
+        run_dict['worker_record'] = worker_record
+        run_dict['job'] = None
+        run_dict['state'] = 'running'
+        run_dict['start_time'] = worker_record.start_time
+        state.set_run_status(run_id, state.RUNNING)
+        running_counts[run_dict['title']] += 1
+        active += 1
+
+def update_run(run_dict):
+    """ Update and return the state of a run | dict --> str """
+    if run_dict['state'] == 'running':
+        worker_record = run_dict['worker_record']
+        if not is_alive(worker_record):
+            run_dict['state'] = 'finished'
+            run_dict['end_time'] = time.time()
+            state.set_run_status(worker_record.run_id, None)
+            if run_dict['cache_key']:
+                cache_output(worker_record.run_id, run_dict)
+    return run_dict['state']
+
+@synchronized
+def end_run(run_id, run_state):
+    """ Mark a run as ended with a specific state | str, str --> None """
+    run_dict = state.run_dicts.get(run_id)
+    if run_dict and run_dict['state'] in ['queued', 'running']:
+        run_dict['state'] = run_state
+        run_dict['end_time'] = time.time()
+        state.set_run_status(run_id, None)
+
+@synchronized
+def prune_runs():
+    """ Forget the oldest ended runs above the run history limit | None --> None """
+    ended = [run_id for run_id, run_dict in state.run_dicts.items()
+             if update_run(run_dict) not in ['queued', 'running']]
+    while len(ended) > config['run_history']:
+        run_id = ended.pop(0)
+        del state.run_dicts[run_id]
+        forget_display(run_id)
+
+@synchronized
+def get_run_info(run_id):
+    """ Get state, running time and print calls of a run | str --> dict
+
+    'position' is the place of a queued run in the queue, None once it left.
+    Returns None if the run doesn't exist.
+    """
+    run_dict = state.run_dicts.get(run_id)
+    if not run_dict:
+        return None
+    run_state = update_run(run_dict)
+    start_time = run_dict['start_time'] or run_dict['submit_time']
+    end_time = run_dict['end_time'] or time.time()
+    position = None
+    if run_state == 'queued':
+        run_ids = [entry[2] for entry in state.pending_runs]
+        position = run_ids.index(run_id) + 1 if run_id in run_ids else None
+    return {'run_id':run_id,
+            'title':run_dict['title'],
+            'state':run_state,
+            'join':run_dict['join'],
+            'elapsed':end_time - start_time,
+            'waited':(run_dict['start_time'] or end_time) - run_dict['submit_time'],
+            'position':position,
+            'cached':run_dict['cached'],
+            'output':get_display_history(run_id)}
+
+def report_timeout(worker_record):
+    """ Print timeout message for a worker | WorkerRecord --> None """
+    name = worker_record.name
+    print('{} timed out, killing process'.format(name))
+    error_message = '{} timed out before completion.\n'.format(name)
+    error_message += 'You can change the timeout value with a kwarg:\n'
+    error_message += 'autofront.add(my_function, '
+    error_message += 'timeout=value_in_seconds)'
+    if config['print_exceptions']:
+        print_to_display(error_message, key=worker_record.run_id)
+    else:
+        print(error_message)
+
+def get_limit_violation(worker_record):
+    """ Resource limit that stopped an ended worker, if any | WorkerRecord --> str """
+    if not worker_record.limits:
+        return None
+    exitcode = worker_record.worker.exitcode
+    if hasattr(signal, 'SIGXCPU') and exitcode == -signal.SIGXCPU:
+        return 'max_cpu_seconds'
+    for limit, exit_code in LIMIT_EXIT_CODES.items():
+        if exitcode == exit_code:
+            return limit
+    return None
+
+def report_limit(worker_record, limit):
+    """ Print resource limit message for a worker | WorkerRecord, str --> None """
+    name = worker_record.name
+    value = worker_record.limits[limit]
+    print('{0} exceeded {1}={2}, process stopped'.format(name, limit, value))
+    error_message = '{0} exceeded its resource limit: {1}={2}\n'.format(name, limit,
+                                                                         value)
+    error_message += 'You can change the resource limits with kwargs:\n'
+    error_message += 'autofront.add(my_function, '
+    error_message += '{}=new_value)'.format(limit)
+    if config['print_exceptions']:
+        print_to_display(error_message, key=worker_record.run_id)
+    else:
+        print(error_message)
+
+def is_alive(worker_record):
+    """ Test if worker is alive and running | WorkerRecord --> Bool
+
+    Pool workers stay alive between jobs, so for them this tests
+    if they are still running the job from this worker_record.
+    """
+    if worker_record.pool_dict:
+        pool_dict = worker_record.pool_dict
+        update_pool_dict(pool_dict)
+        if pool_dict['job'] is not worker_record:
+            return False
+    return worker_record.worker.is_alive()
+
+@synchronized
+def start_reaper():
+    """ Start the reaper thread if it isn't running yet | None --> None """
+    global reaper, reaper_wakeup
+    if reaper:
+        return
+    import socket
+    reaper_wakeup = socket.socketpair()
+    for wakeup_socket in reaper_wakeup: #A full socket means a wakeup is pending anyway
+        wakeup_socket.setblocking(False)
+    reaper = threading.Thread(target=reap_workers, name='reaper', daemon=True)
+    reaper.start()
+
+def wake_reaper():
+    """ Make the reaper check the workers again now | None --> None """
+    if reaper_wakeup:
+        try:
+            reaper_wakeup[1].send(b'\0')
+        except BlockingIOError:
+            pass
+
+def get_reaper_waitables():
+    """ Objects the reaper waits on and how long to wait | None --> [obj], float
+
+    Pool workers send a message when a job is done. Other workers are
+    watched with their process sentinel, which is ready when they exit.
+    """
+    waitables = [reaper_wakeup[0]]
+    for pool_dict in state.pool_dicts:
+        waitables.append(pool_dict['worker'].sentinel)
+        if pool_dict['job'] is not None:
+            waitables.append(pool_dict['connection'])
+    for worker_record in state.worker_records:
+        if not worker_record.pool_dict:
+            waitables.append(worker_record.worker.sentinel)
+    timeout = REAPER_INTERVAL
+    if state.deadlines:
+        timeout = min(timeout, max(0, state.deadlines[0][0] - time.time()))
+    return waitables, timeout
+
+def reap_workers():
+    """ Reaper thread target | None --> None
+
+    Runs cleanup_workers whenever a worker ends, the next deadline is
+    reached or wake_reaper is called, and at least every REAPER_INTERVAL.
+    Errors are printed to the console, the reaper keeps running since no
+    timeout would be enforced without it.
+    """
+    while not stopping:
+        with state.lock:
+            waitables, timeout = get_reaper_waitables()
+        try:
+            multiprocessing.connection.wait(waitables, timeout)
+        except OSError: #Pipe closed while waiting, check everything again
+            pass
+        try:
+            while reaper_wakeup[0].recv(4096):
+                pass
+        except BlockingIOError: #All wakeups read
+            pass
+        try:
+            cleanup_workers()
+        except Exception: #Keep reaping, print like the pool workers do
+            import traceback
+            traceback.print_exc()
 
 def cleanup_workers():
-    """ Remove dead and timed out workers from worker_dicts | None --> None """
+    """ Remove dead and timed out workers from state.worker_records | None --> None
+
+    Workers past their deadline are killed after releasing the state lock,
+    so requests don't wait for them. Queued runs are then started if possible,
+    since every ended worker makes room for one.
+    """
     #info() #Uncomment for development and debugging
-    global worker_dicts
-    print('Removing dead processes if any')
-    worker_dicts = list(filter(is_alive, worker_dicts))
-    print('Removing processes still running past timeout if any')
-    for worker_dict in filter(timeout_expired, worker_dicts):
-        print('Removing dead workers')
-        try:
-            kill(worker_dict['worker'])
-        except RuntimeError:
-            print('Failed to kill {}'.format(worker_dict['worker'].name))
-    worker_dicts = list(filter(timeout_okay, worker_dicts))
-    limit = config['worker_limit']
-    if limit:
-        while len(worker_dicts) > limit:
-            print('Too many workers, ending oldest process')
-            try:
-                kill(worker_dicts[0]['worker'])
-                worker_dicts.pop(0)
-            except RuntimeError:
-                print('Failed to kill {}'.format(worker_dicts[0]['worker'].name))
+    to_kill = []
+    ended_sessions = [] #Run ids of input sessions whose worker ended
+    with state.lock:
+        running = []
+        for worker_record in state.worker_records:
+            if is_alive(worker_record):
+                running.append(worker_record)
+                continue
+            if worker_record.input_connection:
+                ended_sessions.append(worker_record.run_id)
+            run_dict = state.run_dicts.get(worker_record.run_id)
+            limit = get_limit_violation(worker_record)
+            if limit:
+                if not run_dict or run_dict['join']:
+                    report_limit(worker_record, limit)
+                end_run(worker_record.run_id, 'limit exceeded')
+                state.worker_counts['limit exceeded'] += 1
+                continue
+            state.worker_counts['finished'] += 1
+            if run_dict: #Mark the run as finished right away
+                update_run(run_dict)
+        state.worker_records[:] = running
+        current_time = time.time()
+        while state.deadlines and state.deadlines[0][0] <= current_time:
+            worker_record = heapq.heappop(state.deadlines)[2]
+            if worker_record not in state.worker_records: #Ended in time
+                continue
+            run_dict = state.run_dicts.get(worker_record.run_id)
+            if run_dict:
+                if run_dict['join']:
+                    report_timeout(worker_record)
+                end_run(worker_record.run_id, 'timed out')
+            state.worker_records.remove(worker_record)
+            state.worker_counts['timed out'] += 1
+            to_kill.append(worker_record.worker)
+            if worker_record.pool_dict: #No new job until it is replaced
+                worker_record.pool_dict['stopping'] = True
+            if worker_record.input_connection:
+                ended_sessions.append(worker_record.run_id)
+        if len(state.deadlines) > 2 * len(state.worker_records) + 10: #Mostly ended
+            running = set(state.worker_records)
+            state.deadlines[:] = [deadline for deadline in state.deadlines
+                                  if deadline[2] in running]
+            heapq.heapify(state.deadlines)
+    if to_kill:
+        kill_workers(to_kill)
+    end_worker_sessions(ended_sessions)
+    with state.lock:
+        refill_pool()
+        dispatch_runs()
     #info() #Uncomment for development and debugging
 
-def kill(worker):
-    """ Terminate a worker process | obj --> None """
-    print('Killing worker {}'.format(worker.name))
-    worker.terminate()
-    time.sleep(0.5)
+def end_worker_sessions(run_ids):
+    """ End the input sessions of ended workers | [str] --> None
+
+    A session left by its user would otherwise stay open, keeping its print
+    calls off the main page. Requests of the session hold its lock until they
+    have read the end of the worker, so the session is ended after them.
+    Must be called without the state lock, which those requests may wait for.
+    """
+    for run_id in run_ids:
+        input_session = get_input_session(run_id)
+        if not input_session: #Already ended by browser_input
+            continue
+        with input_session['lock']:
+            end_input_session(run_id)
+
+def kill_workers(workers, grace=TERMINATE_GRACE):
+    """ Stop worker processes, killing those that don't exit | [Process] --> None
+
+    Every worker and its process group is sent SIGTERM at once, and the
+    workers get the same grace period to exit. Then every group is sent
+    SIGKILL, which also stops script subprocesses that ignored SIGTERM or
+    outlived their worker. Workers are joined once they exit so no zombie
+    process is left. The outcome is counted in state.worker_counts as
+    'terminated', 'killed' or 'failed'.
+    """
+    for worker in workers:
+        print('Stopping worker {}'.format(worker.name))
+        signal_worker(worker)
+    survivors = wait_for_exit(workers, grace)
+    for worker in survivors:
+        print('Worker {} ignored SIGTERM, killing it'.format(worker.name))
+    for worker in workers:
+        signal_worker(worker, force=True)
+    failed = wait_for_exit(survivors, grace)
+    for worker in failed:
+        print('Failed to kill {}'.format(worker.name))
+    with state.lock:
+        state.worker_counts['terminated'] += len(workers) - len(survivors)
+        state.worker_counts['killed'] += len(survivors) - len(failed)
+        state.worker_counts['failed'] += len(failed)
+
+def signal_worker(worker, force=False):
+    """ Send SIGTERM, or SIGKILL if force, to a worker and its group | Process --> None
+
+    The worker is also signaled directly in case it hasn't created its
+    process group yet (see start_process_group).
+    """
+    if hasattr(os, 'killpg'): #Not on Windows
+        try:
+            os.killpg(worker.pid, signal.SIGKILL if force else signal.SIGTERM)
+        except (ProcessLookupError, PermissionError): #No group yet or already gone
+            pass
     if not worker.is_alive():
-        print('Worker {0} was terminated'.format(worker.name))
-    else:
+        return
+    if not force:
+        worker.terminate()
+    elif hasattr(worker, 'kill'):
+        worker.kill()
+    else: #Python 3.6
+        os.kill(worker.pid, signal.SIGKILL)
+
+def wait_for_exit(workers, timeout):
+    """ Wait until workers exit or timeout is reached | [Process] --> [Process]
+
+    Returns the workers still running. The others are joined.
+    """
+    deadline = time.time() + timeout
+    running = list(workers)
+    while running:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        multiprocessing.connection.wait([worker.sentinel for worker in running],
+                                        remaining)
+        running = [worker for worker in running if worker.is_alive()]
+    for worker in workers:
+        if worker not in running:
+            worker.join()
+    return running
+
+def kill(worker):
+    """ Stop a worker process | obj --> None """
+    kill_workers([worker])
+    if worker.is_alive():
         raise RuntimeError('Failed to kill process')
 
+def get_worker_stats():
+    """ Running workers and how ended workers were reaped | None --> dict
+
+    'running', 'pool' and 'queued' count current workers, pool workers and
+    runs waiting for a worker (see get_queue_stats). The other keys count
+    ended workers since the server started: 'finished' on their own, stopped
+    by a resource limit ('limit exceeded') or 'timed out', and whether stopping
+    them took SIGTERM ('terminated'), SIGKILL ('killed') or 'failed'.
+    """
+    with state.lock:
+        stats = {'running':len(state.worker_records),
+                 'pool':len(state.pool_dicts),
+                 'queued':len(state.pending_runs)}
+        for key in ['finished', 'limit exceeded', 'timed out', 'terminated', 'killed',
+                    'failed']:
+            stats[key] = state.worker_counts[key]
+    return stats
+
+@synchronized
+def get_queue_stats():
+    """ Depth of the run queue and how long runs waited | None --> dict
+
+    'queued' counts runs waiting for a worker, out of 'queue_size'.
+    'longest_wait' is how long the oldest queued run has been waiting.
+    'average_wait' and 'max_wait' are the waiting times of the started runs
+    still in the run history. 'routes' gives the 'queued' and 'running' runs
+    of every route that has any, with its 'priority' and 'max_concurrent'.
+    """
+    current_time = time.time()
+    waits = [run_dict['start_time'] - run_dict['submit_time']
+             for run_dict in state.run_dicts.values() if run_dict['start_time']]
+    running_counts = get_running_counts()
+    queued_runs = [state.run_dicts[entry[2]] for entry in state.pending_runs]
+    routes = {}
+    for run_dict in queued_runs + [run_dict for run_dict in state.run_dicts.values()
+                                   if run_dict['state'] == 'running']:
+        title = run_dict['title']
+        if title not in routes:
+            routes[title] = {'queued':0,
+                             'running':running_counts[title],
+                             'priority':run_dict['priority'],
+                             'max_concurrent':run_dict['max_concurrent']}
+        if run_dict['state'] == 'queued':
+            routes[title]['queued'] += 1
+    longest_wait = 0
+    if queued_runs:
+        longest_wait = current_time - min([run_dict['submit_time']
+                                           for run_dict in queued_runs])
+    return {'queued':len(queued_runs),
+            'queue_size':config['queue_size'],
+            'longest_wait':longest_wait,
+            'average_wait':sum(waits) / len(waits) if waits else 0,
+            'max_wait':max(waits) if waits else 0,
+            'routes':routes}
+
+@synchronized
 def kill_all():
-    """ Terminate all processes in worker_dicts | None --> None
+    """ Terminate all processes in state.worker_records | None --> None
 
     Used for testing in development.
     """
     print('Killing all processes')
-    for worker_dict in worker_dicts:
-        worker = worker_dict['worker']
-        kill(worker)
+    kill_workers([worker_record.worker for worker_record in state.worker_records])
 
 def info():
-    """ Get info on processes in worker_dicts | None --> None """
-    for index, worker_dict in enumerate(worker_dicts):
-        worker = worker_dict['worker']
+    """ Get info on processes in state.worker_records | None --> None """
+    for index, worker_record in enumerate(state.worker_records):
+        worker = worker_record.worker
         print('Worker #{0}: {1}'.format(str(index), worker.name))
-        running_time = str(get_running_time(worker_dict))
+        running_time = str(get_running_time(worker_record))
         dot_index = running_time.find('.')
         print('Running time: {}'.format(running_time[0:dot_index]))
         print('Currently alive: {}'.format(str(worker.is_alive())))
-        timeout = worker_dict['timeout']
+        timeout = worker_record.timeout
         if timeout:
             print('Maximum worker time: {}'.format(str(timeout)))
-    print('{} workers in queue'.format(len(worker_dicts)))
+    print('{} workers in queue'.format(len(state.worker_records)))
     limit = config['worker_limit']
     if limit:
         print('Maximum of {} workers allowed'.format(str(limit)))
@@ -35,12 +35,36 @@ Presently the following types are implemented:
 
 bool - str - int - float - complex - list - tuple - dict
 
+parse_signature_args is used for functions added with typed='signature'.
+Types come from the function's type hints instead of the argument string,
+so the arguments above can be input without type indications:
+
+True, [3, 4], foo={bar : (3.4, 4)}
+
+create_signature_schema reads the type hints once when the route is created
+and returns the functions used to convert each argument. Arguments without
+type hints, or with types that can't be converted, are passed as strings.
+Strings still can't include commas or equal signs unless they're escaped
+with a backslash.
+
+Parsed typed argument strings are kept in an LRU cache, so submitting
+the same string again doesn't parse it again. The cache stores an immutable
+version of the result and every call gets new lists and dicts built from it.
+Its size is set by config['parse_cache_size'] (0 disables it) and
+get_parse_cache_info returns its hit and miss counts.
+
 To understand the parsing method, it's recommended to step through
 an example using the debug manager to follow the parsing logic.
 Change the 'debug' value to True in 'debug.py' to enable the manager.
 Also change the 'step' value to True in 'debug.py' to stop at each step.
 """
 
+import collections
+import inspect
+import re
+import threading
+import typing
+from autofront.config import config
 from autofront.debug import debug_manager
 
 @debug_manager
@@ -157,38 +181,6 @@ def get_last_index(arg_string, target):
     except IndexError:
         return None
 
-@debug_manager
-def get_list_indexes(arg_string):
-    """Find list start and end indexes | str --> list(tuple)"""
-    list_starts = get_char_indexes(arg_string, '[')
-    list_ends = get_char_indexes(arg_string, ']')
-    list_indexes = list(zip(list_starts, list_ends))
-    return list_indexes
-
-@debug_manager
-def get_tuple_indexes(arg_string):
-    """Find tuple start and end indexes | str --> list(tuple)"""
-    tuple_starts = get_char_indexes(arg_string, '(')
-    tuple_ends = get_char_indexes(arg_string, ')')
-    tuple_indexes = list(zip(tuple_starts, tuple_ends))
-    return tuple_indexes
-
-@debug_manager
-def get_dict_indexes(arg_string):
-    """Find dict start and end indexes | str --> list(tuple)"""
-    dict_starts = get_char_indexes(arg_string, '{')
-    dict_ends = get_char_indexes(arg_string, '}')
-    dict_indexes = list(zip(dict_starts, dict_ends))
-    return dict_indexes
-
-@debug_manager
-def get_banned_ranges(indexes_list):
-    """Get range from start and end indexes | list(tuples) --> list(int)"""
-    banned_ranges = []
-    for indexes in indexes_list:
-        banned_ranges += list(range(indexes[0], indexes[1]))
-    return banned_ranges
-
 ESCAPED_CHARS = [',', '='] #Might add more if needed for parsing
 
 @debug_manager
@@ -201,26 +193,6 @@ def get_escaped_indexes(arg_string):
                        if arg_string[index + 1] in ESCAPED_CHARS]
     return escaped_indexes
 
-@debug_manager
-def get_banned_indexes(arg_string):
-    """Get indexes inside lists - tuples - dicts | str --> list(int)
-
-    Note: This will also get these characters when used
-    in words and phrases inside strings, but this is not a problem
-    as the point is to avoid splitting argument in the wrong place.
-    Having extra banned indexes is fine. This also gets the index
-    of escaped commas in type(str) arguments to avoid splitting there.
-    """
-    list_indexes = get_list_indexes(arg_string)
-    tuple_indexes = get_tuple_indexes(arg_string)
-    dict_indexes = get_dict_indexes(arg_string)
-    banned_indexes = []
-    banned_indexes += get_banned_ranges(list_indexes)
-    banned_indexes += get_banned_ranges(tuple_indexes)
-    banned_indexes += get_banned_ranges(dict_indexes)
-    banned_indexes += get_escaped_indexes(arg_string)
-    return banned_indexes
-
 @debug_manager
 def get_colon_indexes(arg_string):
     """Get indexes of all colons | str --> list(int)"""
@@ -228,17 +200,43 @@ def get_colon_indexes(arg_string):
                   if char == ':']
     return colon_list
 
+BRACKETS = {'[' : ']', '(' : ')', '{' : '}'} #Opening --> closing bracket
+
+SPLIT_CHARS = re.compile(r'[,\[\](){}]') #Only characters that affect splitting
+
 @debug_manager
 def get_split_indexes(arg_string):
-    """Find indexes to split string into arguments | str --> list(int)"""
-    comma_indexes = get_char_indexes(arg_string, ',')
-    if not comma_indexes:
+    """Find indexes to split string into arguments | str --> list(int)
+
+    Commas are not split on if they're escaped or inside a list, tuple or dict.
+    Brackets of each kind are counted separately in a single pass. A comma is
+    inside brackets if less brackets have been closed than opened before it,
+    only counting opening brackets that are closed somewhere in the string.
+
+    Note: This will also count these characters when used in words and
+    phrases inside strings, but this is not a problem as the point is to
+    avoid splitting arguments in the wrong place.
+    """
+    if ',' not in arg_string:
         return []
+    total_closes = {close : arg_string.count(close) for close in BRACKETS.values()}
+    opens = dict.fromkeys(total_closes, 0)
+    closes = dict.fromkeys(total_closes, 0)
+    inside = False
     split_indexes = []
-    banned_indexes = get_banned_indexes(arg_string)
-    for comma_index in comma_indexes:
-        if comma_index not in banned_indexes:
-            split_indexes.append(comma_index)
+    for match in SPLIT_CHARS.finditer(arg_string):
+        char = match.group()
+        index = match.start()
+        if char == ',':
+            if not inside and arg_string[index - 1:index] != '\\':
+                split_indexes.append(index)
+            continue
+        if char in BRACKETS:
+            opens[BRACKETS[char]] += 1
+        else:
+            closes[char] += 1
+        inside = any(closes[close] < min(opens[close], total_closes[close])
+                     for close in closes)
     return split_indexes
 
 @debug_manager
@@ -315,7 +313,7 @@ def parse_type_kwargs(kwarg_list):
 @debug_manager
 def get_first_kwarg_equal(arg_string):
     """ Find first kwarg equal sign | str --> int or None """
-    escaped_indexes = get_escaped_indexes(arg_string)
+    escaped_indexes = set(get_escaped_indexes(arg_string))
     kwarg_equal_indexes = get_char_indexes(arg_string, '=')
     kwarg_equal_indexes = [index for index in kwarg_equal_indexes
                            if not index in escaped_indexes]
@@ -330,7 +328,7 @@ def get_arg_bool(arg_string):
         return False
     first_kwarg_equal = get_first_kwarg_equal(arg_string)
     if first_kwarg_equal:
-        escaped_indexes = get_escaped_indexes(arg_string)
+        escaped_indexes = set(get_escaped_indexes(arg_string))
         arg_end = get_char_indexes(arg_string[0:first_kwarg_equal], ',')
         arg_end = [index for index in arg_end
                    if not index in escaped_indexes]
@@ -349,6 +347,47 @@ def get_kwarg_bool(arg_string):
         return True
     return False # If arg_string but no equal sign, no **kwargs
 
+parse_cache = collections.OrderedDict() #Argument string --> frozen parsed args
+parse_cache_info = {'hits':0, 'misses':0}
+parse_cache_lock = threading.Lock()
+
+def freeze_parsed(value):
+    """Convert parsed value to nested tuples that can't be modified | any --> tuple"""
+    if type(value) is list:
+        return ('list', tuple([freeze_parsed(item) for item in value]))
+    if type(value) is tuple:
+        return ('tuple', tuple([freeze_parsed(item) for item in value]))
+    if type(value) is dict:
+        return ('dict', tuple([(freeze_parsed(key), freeze_parsed(item))
+                               for key, item in value.items()]))
+    return ('value', value)
+
+def thaw_parsed(frozen):
+    """Create new parsed value from frozen version | tuple --> any"""
+    kind, content = frozen
+    if kind == 'value':
+        return content
+    if kind == 'list':
+        return [thaw_parsed(item) for item in content]
+    if kind == 'tuple':
+        return tuple([thaw_parsed(item) for item in content])
+    return {thaw_parsed(key) : thaw_parsed(item) for key, item in content}
+
+def get_parse_cache_info():
+    """Get parse cache hits, misses and size | None --> dict"""
+    with parse_cache_lock:
+        return {'hits':parse_cache_info['hits'],
+                'misses':parse_cache_info['misses'],
+                'size':len(parse_cache),
+                'max_size':config['parse_cache_size']}
+
+def clear_parse_cache():
+    """Empty parse cache and reset its counters | None --> None"""
+    with parse_cache_lock:
+        parse_cache.clear()
+        parse_cache_info['hits'] = 0
+        parse_cache_info['misses'] = 0
+
 @debug_manager
 def parse_type_args(all_arg_string):
     """ Parse typed argument string
@@ -356,7 +395,8 @@ def parse_type_args(all_arg_string):
     Called from outside module. Parses an argument string possibly
     containing multiple arguments in a specific format.
 
-    See module docs for more info.
+    See module docs for more info. Results are cached, but every call
+    returns new lists and dicts, so they can be modified safely.
 
     Args:
         str: A string of typed arguments
@@ -365,6 +405,28 @@ def parse_type_args(all_arg_string):
         list: A list of arguments and keyword arguments
               with the correct type.
     """
+    max_size = config['parse_cache_size']
+    if not max_size:
+        return parse_type_args_uncached(all_arg_string)
+    with parse_cache_lock:
+        frozen = parse_cache.get(all_arg_string)
+        if frozen is not None:
+            parse_cache.move_to_end(all_arg_string)
+            parse_cache_info['hits'] += 1
+        else:
+            parse_cache_info['misses'] += 1
+    if frozen is None:
+        all_args = parse_type_args_uncached(all_arg_string) #Errors aren't cached
+        frozen = freeze_parsed(all_args)
+        with parse_cache_lock:
+            parse_cache[all_arg_string] = frozen
+            while len(parse_cache) > max_size:
+                parse_cache.popitem(last=False)
+    return thaw_parsed(frozen)
+
+@debug_manager
+def parse_type_args_uncached(all_arg_string):
+    """ Parse typed argument string without using the cache | str --> list """
     all_arg_string = strip_surrounding_spaces(all_arg_string)
     arg_bool = get_arg_bool(all_arg_string)
     kwarg_bool = get_kwarg_bool(all_arg_string)
@@ -397,6 +459,161 @@ def parse_type_args(all_arg_string):
     all_args = [parsed_args, parsed_kwargs]
     return all_args
 
+SIGNATURE_ERROR_MESSAGE = ['Autofront could not convert your arguments ' +
+                           'to the types in the function signature.',
+                           'Check the type hints of your function and make sure ' +
+                           'lists, tuples and dicts are opened and closed as usual.',
+                           'Keys and values in dicts must be separated by a colon ' +
+                           'with spaces around it.']
+
+SCALAR_TYPES = {bool : 'bool',
+                str : 'str',
+                int : 'int',
+                float : 'float',
+                complex : 'complex'}
+
+def convert_string(arg):
+    """Convert argument to str, same as untyped args | str --> str"""
+    if not arg.strip(' '):
+        return ''
+    return PARSING_FUNCTIONS['str'](strip_surrounding_spaces(arg))
+
+def get_items(arg, brackets):
+    """Split the contents of a list, tuple or dict string | str, str --> list(str)"""
+    arg = arg.strip(' ')
+    if len(arg) < 2 or arg[0] != brackets[0] or arg[-1] != brackets[1]:
+        raise ValueError('Expected {0}...{1} but got "{2}"'.format(brackets[0],
+                                                                   brackets[1], arg))
+    arg_string = arg[1:-1].strip(' ')
+    if not arg_string:
+        return []
+    return split_type_args(arg_string)
+
+def create_converter(annotation):
+    """Create function converting an argument string to a type | type --> func
+
+    Converters for lists, tuples and dicts are built from the converters
+    of their items, so the type hints are only read once. Optional types
+    convert 'None' to None.
+    """
+    origin = getattr(annotation, '__origin__', None) or annotation
+    type_args = getattr(annotation, '__args__', None) or ()
+    if type(annotation).__name__ == 'UnionType': #int | str in Python 3.10+
+        origin = typing.Union
+    if annotation is str:
+        return convert_string
+    if annotation in SCALAR_TYPES:
+        type_name = SCALAR_TYPES[annotation]
+        return lambda arg: PARSING_FUNCTIONS[type_name](arg.strip(' '))
+    if origin is list:
+        item_converter = create_converter(type_args[0] if type_args else str)
+        return lambda arg: [item_converter(item) for item in get_items(arg, '[]')]
+    if origin is tuple:
+        if not type_args or type_args[-1] is Ellipsis:
+            item_converter = create_converter(type_args[0] if type_args else str)
+            return lambda arg: tuple([item_converter(item)
+                                      for item in get_items(arg, '()')])
+        item_converters = [create_converter(type_arg) for type_arg in type_args]
+        def convert_tuple(arg):
+            items = get_items(arg, '()')
+            if len(items) != len(item_converters):
+                raise ValueError('Expected {0} items in "{1}"'.format(
+                    len(item_converters), arg))
+            return tuple([converter(item) for converter, item
+                          in zip(item_converters, items)])
+        return convert_tuple
+    if origin is dict:
+        key_converter = create_converter(type_args[0] if type_args else str)
+        value_converter = create_converter(type_args[1] if type_args else str)
+        def convert_dict(arg):
+            new_dict = {}
+            for item in get_items(arg, '{}'):
+                key, separator, value = item.partition(' : ')
+                if not separator:
+                    raise ValueError('Dict items must be "key : value"')
+                new_dict[key_converter(key)] = value_converter(value)
+            return new_dict
+        return convert_dict
+    if origin is typing.Union: #Includes Optional, tries each type in order
+        optional = type(None) in type_args
+        converters = [create_converter(type_arg) for type_arg in type_args
+                      if type_arg is not type(None)]
+        def convert_union(arg):
+            if optional and arg.strip(' ') == 'None':
+                return None
+            for converter in converters[:-1]:
+                try:
+                    return converter(arg)
+                except (ValueError, IndexError):
+                    pass
+            return converters[-1](arg)
+        return convert_union
+    return convert_string #No type hint or unsupported type
+
+def create_signature_schema(function, fixed_arg_count=0):
+    """Read function type hints to convert live args | func, int --> dict
+
+    Called once by autofront.add. Positional parameters already given
+    as fixed args are skipped, since live args are added after them.
+    """
+    signature = inspect.signature(function)
+    try:
+        type_hints = typing.get_type_hints(function)
+    except Exception: #Unresolvable string annotations, use them as they are
+        type_hints = {name : parameter.annotation for name, parameter
+                      in signature.parameters.items()}
+    schema = {'positional':[], 'keyword':{}, 'var_positional':None,
+              'var_keyword':None}
+    for name, parameter in signature.parameters.items():
+        converter = create_converter(type_hints.get(name, str))
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            schema['var_positional'] = converter
+        elif parameter.kind == parameter.VAR_KEYWORD:
+            schema['var_keyword'] = converter
+        else:
+            if parameter.kind != parameter.KEYWORD_ONLY:
+                schema['positional'].append(converter)
+            if parameter.kind != parameter.POSITIONAL_ONLY:
+                schema['keyword'][name] = converter
+    schema['positional'] = schema['positional'][fixed_arg_count:]
+    return schema
+
+@debug_manager
+def parse_signature_args(all_arg_string, schema):
+    """Parse argument string using a signature schema | str, dict --> list
+
+    Args are input as usual in Python, without type indications. Keyword
+    arguments are recognized by a valid parameter name before an equal sign.
+
+    Returns:
+        list: A list of arguments and keyword arguments
+              with the type from the function signature.
+    """
+    all_arg_string = all_arg_string.strip(' ')
+    args = []
+    kwargs = {}
+    if not all_arg_string:
+        return [args, kwargs]
+    for arg in split_type_args(all_arg_string):
+        name, separator, value = arg.partition('=')
+        if separator and name.strip(' ').isidentifier():
+            name = name.strip(' ')
+            converter = schema['keyword'].get(name, schema['var_keyword'])
+            if converter is None:
+                raise ValueError('Unexpected keyword argument "{}"'.format(name))
+            kwargs[name] = converter(value)
+        elif kwargs:
+            raise ValueError('Positional argument follows keyword argument')
+        else:
+            if len(args) < len(schema['positional']):
+                converter = schema['positional'][len(args)]
+            else:
+                converter = schema['var_positional']
+            if converter is None:
+                raise ValueError('Too many positional arguments')
+            args.append(converter(arg))
+    return [args, kwargs]
+
 @debug_manager
 def strip_surrounding_spaces(string):
     """Strip leading and trailing space | str --> str"""
@@ -0,0 +1,171 @@
+""" Record types for routes and workers
+
+Routes and workers are created in large numbers and their fields are read
+on every request, so they use __slots__ instead of dictionaries. This keeps
+each record small and attribute access fast.
+
+Route stores everything autofront.add knows about a route. It is shared by
+every call to the route and must not be modified to store per-call state.
+Input sessions and runs keep that state separately (see input_utilities.py
+and multi.py).
+
+WorkerRecord stores a worker started by multi.create_process.
+
+ServerState stores the workers, runs and input session statuses of the
+server process. There is a single instance, config.state.
+"""
+import collections
+import threading
+
+class Route:
+    """ A route created with autofront.add
+
+    function (func): function to run, None if script
+    script (bool): True if script, False if function
+    script_path (str): path of the script, None if function
+    args (list): fixed args
+    kwargs (dict): fixed kwargs
+    typed (bool or str): True if live args use type indications,
+                         'signature' if they use the function's type hints
+    link (str): title given to autofront.add
+    title (str): title displayed in the browser, includes fixed args if live
+    live (bool): True if args are input in the browser
+    input (bool): True if the function or script uses input calls
+    join (bool): False if the function or script runs in the background
+    timeout (float): maximum running time, None to use the default
+    in_process (bool): True if the script runs with runpy inside the worker
+    schema (dict): live arg converters for typed='signature', None otherwise
+    limits (dict): resource limits and nice value of the worker, None if no limits
+    priority (int): runs with a higher priority start first when runs are queued
+    max_concurrent (int): maximum number of runs at once, None if no maximum
+    cache (dict): 'ttl' and 'size' of the route's result cache, None if not cached
+    """
+    __slots__ = ('function', 'script', 'script_path', 'args', 'kwargs', 'typed',
+                 'link', 'title', 'live', 'input', 'join', 'timeout', 'in_process',
+                 'schema', 'limits', 'priority', 'max_concurrent', 'cache')
+
+    def __init__(self, function=None, script=False, script_path=None, args=(),
+                 kwargs=None, typed=False, link=None, title=None, live=False,
+                 input=False, join=False, timeout=None, in_process=False,
+                 schema=None, limits=None, priority=0, max_concurrent=None,
+                 cache=None):
+        self.function = function
+        self.script = script
+        self.script_path = script_path
+        self.args = list(args)
+        self.kwargs = dict(kwargs or {})
+        self.typed = typed
+        self.link = link
+        self.title = title
+        self.live = live
+        self.input = input
+        self.join = join
+        self.timeout = timeout
+        self.in_process = in_process
+        self.schema = schema
+        self.limits = limits
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.cache = cache
+
+    def __repr__(self):
+        fields = ', '.join('{0}={1!r}'.format(name, getattr(self, name))
+                           for name in self.__slots__)
+        return 'Route({})'.format(fields)
+
+class WorkerRecord:
+    """ A worker started by multi.create_process
+
+    worker (Process): the actual worker
+    name (str): name of the function or script being run
+    start_time (float): process start time
+    timeout (float): maximum allowed running time, None if no timeout limit
+    pool_dict (dict): pool worker running the job, None if not in pool mode
+    input_connection (Connection): main process end of the input pipe,
+                                   None if the route has no input calls
+    run_id (str): id of the run or input session this worker belongs to, None if neither
+    limits (dict): resource limits applied by the worker, None if no limits
+    """
+    __slots__ = ('worker', 'name', 'start_time', 'timeout', 'pool_dict',
+                 'input_connection', 'run_id', 'limits')
+
+    def __init__(self, worker, name, start_time, timeout=None, pool_dict=None,
+                 input_connection=None, run_id=None, limits=None):
+        self.worker = worker
+        self.name = name
+        self.start_time = start_time
+        self.timeout = timeout
+        self.pool_dict = pool_dict
+        self.input_connection = input_connection
+        self.run_id = run_id
+        self.limits = limits
+
+    def __repr__(self):
+        return 'WorkerRecord(name={0!r}, start_time={1!r}, run_id={2!r})'.format(
+            self.name, self.start_time, self.run_id)
+
+class ServerState:
+    """ Shared state of the server process
+
+    The server handles requests in several threads, so these fields are only
+    changed while holding lock, and lists are updated in place instead of being
+    replaced. See multi.py for the worker, pool and run records.
+
+    lock (RLock): reentrant since locked functions call each other
+    worker_records (list): WorkerRecord of every worker, oldest first
+    pool_dicts (list): pre-spawned pool workers when pool mode is active
+    run_dicts (dict): run id --> run_dict of every route call made from the main page
+    pending_runs (list): (-priority, order, run id) of runs waiting for a worker, sorted
+    run_status (dict): run id --> status of every run and input session in progress
+    deadlines (list): heap of (deadline, count, WorkerRecord) for workers with a timeout
+    worker_counts (Counter): how many workers ended and how, see multi.get_worker_stats
+    """
+    __slots__ = ('lock', 'worker_records', 'pool_dicts', 'run_dicts', 'pending_runs',
+                 'run_status', 'deadlines', 'worker_counts')
+
+    RECEIVED = 'received' #Run waiting for a worker
+    RUNNING = 'running' #Worker started
+    INPUT = 'input' #Input session, its print calls are displayed by browser_input
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.worker_records = []
+        self.pool_dicts = []
+        self.run_dicts = {}
+        self.pending_runs = []
+        self.run_status = {}
+        self.deadlines = []
+        self.worker_counts = collections.Counter()
+
+    def set_run_status(self, run_id, status):
+        """ Set status of a run or input session, None when over | str, str --> None """
+        with self.lock:
+            if status is None:
+                self.run_status.pop(run_id, None)
+            else:
+                self.run_status[run_id] = status
+
+    def get_run_status(self, run_id):
+        """ Get status of a run or input session, None if over | str --> str """
+        return self.run_status.get(run_id)
+
+    def get_private_keys(self):
+        """ Run ids whose print calls the main page can't display or clear | None --> set
+
+        Input sessions are displayed by their own page and runs still waiting
+        for a worker have no print calls to lose yet.
+        """
+        with self.lock:
+            return {run_id for run_id, status in self.run_status.items()
+                    if status in [self.RECEIVED, self.INPUT]}
+
+    def has_active_runs(self):
+        """ Test if a run is waiting for a worker or running | None --> bool """
+        with self.lock:
+            return any([status in [self.RECEIVED, self.RUNNING]
+                        for status in self.run_status.values()])
+
+    def __repr__(self):
+        return 'ServerState(workers={0}, pool={1}, runs={2}, pending={3})'.format(
+            len(self.worker_records), len(self.pool_dicts), len(self.run_dicts),
+            len(self.pending_runs))
@@ -14,6 +14,7 @@ from simple_functions import foo, bar, positional, keywords, combined
 from simple_functions import mixed_args, bugged_function, types, types_kwarg
 from simple_functions import foo_args, return_value, return_value_args
 from simple_functions import return_value_types_args, input_function
+from simple_functions import signature_optional, signature_types
 
 #Initialize server to display results at top of page
 autofront.initialize(top=True)
@@ -67,6 +68,10 @@ autofront.add(types, live=True, typed=True, join=True)
 autofront.add(types_kwarg, live=True, typed=True, join=True)
 #Route to script with live typed args and kwargs with a return value
 autofront.add(return_value_types_args, live=True, typed=True, join=True)
+#Route to function with live args converted with its type hints
+autofront.add(signature_types, live=True, typed='signature', join=True)
+#Route to function with live args converted with Optional type hints
+autofront.add(signature_optional, live=True, typed='signature', join=True)
 #Route to bugged function - Exception should print in browser
 autofront.add(bugged_function, join=True)
 #Route to bugged script - Exception should print in browser
@@ -0,0 +1,77 @@
+""" Test the result cache of function routes
+
+This module calls a slow cached function several times. Calls with args
+already used must display the same output right away without starting a
+worker, the results above the cache size must be pushed out, and results
+older than the cache ttl must be computed again.
+
+Run it directly from the tests directory::
+    python cache_test.py
+
+It prints every call, whether its result came from the cache and the
+final cache info, and exits with an error if a check fails.
+"""
+import json
+import sys
+import time
+import autofront
+
+TTL = 2 #Seconds before results of the 'report_ttl' route expire
+
+def report(*args):
+    time.sleep(0.5)
+    print('Report on {0} made at {1}'.format(', '.join(args), time.time()))
+    return len(args)
+
+autofront.initialize()
+autofront.add(report, live=True, cache=True, cache_size=2, title='report')
+autofront.add(report, 'fixed', cache=True, cache_ttl=TTL, title='report_ttl')
+
+CALLS = [('report', 'a', False),
+         ('report', 'a', True),
+         ('report', 'b', False),
+         ('report', 'c', False), #Pushes 'a' out
+         ('report', 'a', False),
+         ('report', 'c', True),
+         ('report_ttl', '', False),
+         ('report_ttl', '', True),
+         ('wait', '', None), #Results of 'report_ttl' expire
+         ('report_ttl', '', False)]
+
+def call(client, title, arg_string):
+    """ Call a route and wait for its run to finish | Flask client, str, str --> dict """
+    route = [route for route in autofront.config.config['routes']
+             if route.link == title][0]
+    location = client.post('/', data={route.title:arg_string}).location
+    run_url = location.rsplit('/', 1)[0] #Run page --> run status
+    while True:
+        run_info = json.loads(client.get(run_url).data)
+        if run_info['state'] not in ['queued', 'running']:
+            return run_info
+        time.sleep(0.05)
+
+if __name__ == '__main__':
+    client = autofront.create_wsgi_app().test_client()
+    failed = []
+    outputs = {}
+    for title, arg_string, cached in CALLS:
+        if title == 'wait':
+            time.sleep(TTL)
+            continue
+        run_info = call(client, title, arg_string)
+        output = ''.join(run_info['output'])
+        print('{0} {1!r}: cached {2} in {3:.2f} seconds'.format(title, arg_string,
+                                                              run_info['cached'],
+                                                              run_info['elapsed']))
+        if run_info['cached'] != cached:
+            failed.append('{0} {1!r} cached should be {2}'.format(title, arg_string,
+                                                                 cached))
+        if cached and output != outputs[(title, arg_string)]:
+            failed.append('{0} {1!r} output changed'.format(title, arg_string))
+        outputs[(title, arg_string)] = output
+    print(autofront.get_result_cache_info())
+    for message in failed:
+        print('FAILED: {}'.format(message))
+    if failed:
+        sys.exit(1)
+    print('All checks passed')
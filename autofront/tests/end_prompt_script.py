@@ -0,0 +1,3 @@
+print('Enter your name: ', end='')
+name = input()
+print('Hello {}'.format(name))
@@ -6,6 +6,6 @@ def delayed_print(string):
     autofront.utilities.print_to_display(string)
 
 autofront.add(delayed_print, live=True, join=False)
-autofront.add(autofront.get_display)
+autofront.add(autofront.get_display) #Should display a RuntimeError, runs in a worker
 
 autofront.run()
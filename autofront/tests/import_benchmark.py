@@ -0,0 +1,54 @@
+""" Benchmark for autofront import time
+
+Worker processes are started with spawn, so they import autofront again
+every time they start. This module measures what they import with
+'python -X importtime' and checks that server modules like Flask are only
+imported when the server is initialized.
+
+Run it directly from any directory where autofront can be imported::
+    python import_benchmark.py
+
+It prints the import time and number of modules for each case and exits
+with an error if a case imports a module it shouldn't.
+"""
+import subprocess
+import sys
+
+SERVER_MODULES = ['flask', 'jinja2', 'werkzeug', 'autofront.views',
+                  'autofront.parse', 'autofront.detect']
+
+CASES = [('worker', 'import autofront.multi', SERVER_MODULES),
+         ('main module in worker', 'import autofront; autofront.add', SERVER_MODULES),
+         ('server', 'import autofront.views', [])]
+
+REPEAT = 5
+
+def measure(statement):
+    """ Import time in ms and imported modules for a statement | str --> float, [str] """
+    command = [sys.executable, '-X', 'importtime', '-c', statement]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    total = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, module = line[len('import time:'):].split('|')
+        total += int(self_time)
+        modules.append(module.strip())
+    return total / 1000, modules
+
+if __name__ == '__main__':
+    failed = False
+    for name, statement, forbidden in CASES:
+        results = [measure(statement) for _ in range(REPEAT)]
+        best_time = min([result[0] for result in results])
+        modules = results[0][1]
+        print('{0:22} {1:8.1f} ms {2:4} modules'.format(name, best_time, len(modules)))
+        loaded = sorted(set([module for module in forbidden
+                             if module in modules]))
+        if loaded:
+            failed = True
+            print('    should not import: {}'.format(', '.join(loaded)))
+    if failed:
+        sys.exit(1)
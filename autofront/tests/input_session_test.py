@@ -0,0 +1,123 @@
+""" Test input sessions of scripts and functions
+
+This module runs input routes through the Flask test client and checks
+that they behave as they would in a browser:
+
+- A script printing its prompt with end='' before calling input() must
+  still get its prompt to the browser right away.
+- Print calls of an open input session must not reach the display stream
+  of other users.
+- Sessions left by their user must end when their worker times out or
+  finishes, so their print calls reach the main page.
+
+Run it directly from the tests directory::
+    python input_session_test.py
+
+It prints each check and exits with an error if one of them fails.
+"""
+import sys
+import time
+import autofront
+from autofront.config import state
+from autofront.input_utilities import get_input_session
+from autofront.utilities import get_display_index
+
+TIMEOUT = 6 #Timeout of the input routes, a check waiting this long has failed
+
+LEFT_TIMEOUT = 1 #Timeout of the route used for sessions left by their user
+
+def ask_name():
+    name = input('Enter your name')
+    print('Goodbye {}'.format(name))
+
+autofront.initialize()
+autofront.add('end_prompt_script.py', timeout=TIMEOUT)
+autofront.add(ask_name, timeout=LEFT_TIMEOUT)
+
+def start_session(client, title):
+    """ Start an input route and wait for its first prompt | Flask client, str --> str
+
+    Returns the URL of the input session and how long the prompt took.
+    """
+    location = client.post('/', data={title:''}).location
+    start_time = time.time()
+    client.get(location) #Starts the worker, waits for the first prompt
+    return location, time.time() - start_time
+
+def check_end_prompt(client):
+    """ Prompt printed with end='' before input() | Flask client --> [str] """
+    failed = []
+    location, prompt_time = start_session(client, 'end_prompt_script.py')
+    print('Prompt received in {:.2f} seconds'.format(prompt_time))
+    if prompt_time >= TIMEOUT:
+        failed.append('prompt printed with end= never reached the browser')
+    page = client.get(location).data.decode()
+    if 'Enter your name:' not in page:
+        failed.append('text printed before the prompt was not displayed')
+    if 'AUTOFRONT_PROMPT' in page:
+        failed.append('prompt marker was displayed')
+    client.post(location, data={'Input':'Ada'})
+    client.get(location) #Ends the session
+    page = client.get('/').data.decode()
+    if 'Hello Ada' not in page:
+        failed.append('script did not receive the input')
+    return failed
+
+def read_stream(client, since):
+    """ Events of the unkeyed stream until it waits | Flask client, int --> str """
+    response = client.get('/stream?since={}'.format(since), buffered=False)
+    events = ''
+    for chunk in response.response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith(': keep-alive'): #No more print calls to send
+            break
+        events += chunk
+    response.close()
+    return events
+
+def check_private_stream(client):
+    """ Print calls of an open session on the unkeyed stream | Flask client --> [str] """
+    failed = []
+    since = get_display_index()
+    location = start_session(client, 'end_prompt_script.py')[0]
+    events = read_stream(client, since)
+    print('Unkeyed stream sent {} events'.format(events.count('data: ')))
+    if 'Enter your name:' in events:
+        failed.append('print calls of an open input session were streamed')
+    client.post(location, data={'Input':'Ada'})
+    client.get(location) #Ends the session
+    return failed
+
+def wait_for_session_end(run_id):
+    """ Wait until an input session has ended | str --> bool """
+    end_time = time.time() + LEFT_TIMEOUT + 2 #Lets the reaper stop the worker
+    while time.time() < end_time:
+        if not get_input_session(run_id) and run_id not in state.get_private_keys():
+            return True
+        time.sleep(0.1)
+    return False
+
+def check_left_sessions(client):
+    """ Sessions left before and after the last input | Flask client --> [str] """
+    failed = []
+    location = start_session(client, 'ask_name')[0]
+    if not wait_for_session_end(location.rsplit('/', 1)[1]):
+        failed.append('session left at its prompt did not end on timeout')
+    location = start_session(client, 'ask_name')[0]
+    client.post(location, data={'Input':'Ada'}) #Worker finishes, page never reloaded
+    if not wait_for_session_end(location.rsplit('/', 1)[1]):
+        failed.append('session left after its worker finished did not end')
+    if 'Goodbye Ada' not in client.get('/').data.decode():
+        failed.append('print calls of the left session were not displayed')
+    return failed
+
+if __name__ == '__main__':
+    client = autofront.create_wsgi_app().test_client()
+    failed = check_private_stream(client)
+    failed += check_end_prompt(client)
+    failed += check_left_sessions(client)
+    for message in failed:
+        print('FAILED: {}'.format(message))
+    if failed:
+        sys.exit(1)
+    print('All checks passed')
@@ -0,0 +1,35 @@
+import os
+import autofront
+
+def memory_function(megabytes):
+    print('Allocating {} MB'.format(str(megabytes)))
+    data = bytearray(megabytes * 1024 * 1024)
+    print('Warning! Allocated past memory limit')
+
+def cpu_function():
+    print('Counting until CPU limit')
+    count = 0
+    while True:
+        count += 1
+        if count % 100000000 == 0:
+            print('Counted to {}'.format(str(count)))
+
+def files_function(count):
+    print('Opening {} files'.format(str(count)))
+    files = [open(__file__) for index in range(count)]
+    print('Warning! Opened past open files limit')
+
+def nice_function():
+    print('Niceness is {}'.format(str(os.nice(0))))
+
+autofront.add(memory_function, 500, max_memory=200, join=True, title='memory_200')
+
+autofront.add(memory_function, 50, max_memory=200, join=True, title='memory_200_ok')
+
+autofront.add(cpu_function, max_cpu_seconds=2, join=True, title='cpu_2')
+
+autofront.add(files_function, 100, max_open_files=50, join=True, title='files_50')
+
+autofront.add(nice_function, nice=10, join=True, title='nice_10')
+
+autofront.run()
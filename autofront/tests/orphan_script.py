@@ -0,0 +1,19 @@
+""" Script that starts a process ignoring SIGTERM, then hangs
+
+Used by orphan_test.py. The first command-line arg is the file where the
+script writes its own process id and the one of its child.
+"""
+import os
+import subprocess
+import sys
+import time
+
+CHILD_CODE = ('import signal, time; '
+              'signal.signal(signal.SIGTERM, signal.SIG_IGN); '
+              'time.sleep(60)')
+
+child = subprocess.Popen([sys.executable, '-c', CHILD_CODE])
+with open(sys.argv[1], 'w') as pid_file:
+    pid_file.write('{0} {1}'.format(os.getpid(), child.pid))
+print('Started child process {}'.format(child.pid))
+time.sleep(60)
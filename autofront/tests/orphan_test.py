@@ -0,0 +1,82 @@
+""" Test that timed out script routes leave no orphan processes
+
+This module adds two routes to orphan_script.py with a one second timeout,
+one running in a pool worker and one in a new worker. The script starts
+a child process that ignores SIGTERM and both of them hang. Once the routes
+have timed out, neither the scripts nor their children may still be running.
+
+Only works on Linux and MacOS, since Windows has no process groups.
+
+Run it directly from the tests directory::
+    python orphan_test.py
+
+It prints the processes it checked and exits with an error if any of
+them is still running.
+"""
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import autofront
+
+PID_FILES = [pathlib.Path(tempfile.gettempdir()).joinpath(
+    'autofront_orphan_{}.txt'.format(index)) for index in range(2)]
+
+autofront.initialize(pool_size=1)
+for index, pid_file in enumerate(PID_FILES):
+    autofront.add('orphan_script.py', str(pid_file), join=True, timeout=1,
+                  title='orphan_{}'.format(index))
+
+def is_running(pid):
+    """ Test if a process is running, zombies don't count | int --> bool """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    stat_path = pathlib.Path('/proc/{}/stat'.format(pid))
+    try: #Linux only, MacOS zombies are counted as running
+        return stat_path.read_text().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (OSError, IndexError):
+        return True
+
+def wait_for_run(client, location):
+    """ Poll a run until it is over | Flask client, str --> dict """
+    run_url = location.rsplit('/', 1)[0] #Run page --> run status
+    while True:
+        run_info = json.loads(client.get(run_url).data)
+        if run_info['state'] not in ['queued', 'running']:
+            return run_info
+        time.sleep(0.1)
+
+if __name__ == '__main__':
+    for pid_file in PID_FILES:
+        if pid_file.exists():
+            pid_file.unlink()
+    client = autofront.autofront.app.test_client()
+    autofront.multi.start_pool()
+    locations = [client.post('/', data={'orphan_{}'.format(index):''}).location
+                 for index in range(len(PID_FILES))]
+    states = [wait_for_run(client, location)['state'] for location in locations]
+    print('Run states: {}'.format(', '.join(states)))
+    time.sleep(3) #Longer than the grace period of kill_workers
+    failed = False
+    for pid_file in PID_FILES:
+        if not pid_file.exists():
+            print('FAILED: {} was never written'.format(pid_file))
+            failed = True
+            continue
+        script_pid, child_pid = [int(pid) for pid in pid_file.read_text().split()]
+        pid_file.unlink()
+        for name, pid in [('script', script_pid), ('child', child_pid)]:
+            running = is_running(pid)
+            print('{0} {1}: {2}'.format(name, pid, 'RUNNING' if running else 'stopped'))
+            if running:
+                failed = True
+                os.kill(pid, 9) #Clean up after the failed test
+    print(autofront.multi.get_worker_stats())
+    if failed or states != ['timed out'] * len(PID_FILES):
+        print('FAILED')
+        sys.exit(1)
+    print('No orphan processes left')
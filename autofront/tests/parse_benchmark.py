@@ -0,0 +1,40 @@
+""" Benchmark for typed argument parsing
+
+This module times autofront.parse.parse_type_args on typed argument strings
+of increasing size, like a long list of floats pasted from a spreadsheet.
+Parsing time should grow linearly with the size of the argument string.
+The parse cache is disabled so every call is timed, not cache hits.
+
+Run it directly, no server is started::
+    python parse_benchmark.py
+"""
+import timeit
+from autofront.config import config
+from autofront.parse import parse_type_args
+
+config['parse_cache_size'] = 0 #Time the parser, not the cache
+
+def float_list(length):
+    """ Typed list of floats | int --> str """
+    values = ', '.join(['float:{}'.format(index + 0.5) for index in range(length)])
+    return 'list:[' + values + ']'
+
+def nested_list(length):
+    """ Typed list of small tuples and dicts | int --> str """
+    values = ', '.join(['tuple:(int:{0}, str:a)'.format(index) if index % 2
+                        else 'dict:{{str:k : int:{0}}}'.format(index)
+                        for index in range(length)])
+    return 'list:[' + values + '], str:key = ' + float_list(10)
+
+CASES = [('floats', float_list), ('nested', nested_list)]
+
+SIZES = [10, 100, 1000, 5000]
+
+if __name__ == '__main__':
+    for name, create_string in CASES:
+        for size in SIZES:
+            arg_string = create_string(size)
+            repeat = max(1, 2000 // size)
+            seconds = timeit.timeit(lambda: parse_type_args(arg_string), number=repeat)
+            print('{0:8} {1:6} items {2:7} chars {3:10.3f} ms'.format(
+                name, size, len(arg_string), seconds / repeat * 1000))
@@ -0,0 +1,70 @@
+""" Test the run queue priorities and limits
+
+This module allows two workers at once and six queued runs, then clicks
+routes faster than they can run. Queued runs must start by priority, runs
+of the 'capped' route must never run at the same time, and the run above
+the queue size must be rejected.
+
+Run it directly from the tests directory::
+    python queue_test.py
+
+It prints when each run waited for a worker and the final queue stats,
+and exits with an error if a check fails.
+"""
+import json
+import sys
+import time
+import autofront
+
+CLICKS = ['low', 'low', #Start right away
+          'capped', 'capped', 'capped', 'low', 'low', 'high', #Fill the queue
+          'low'] #Rejected
+
+NAP = 0.5 #Running time of every run in seconds
+
+def nap():
+    time.sleep(NAP)
+    print('Napped for {} seconds'.format(NAP))
+
+autofront.initialize(worker_limit=2, queue_size=6)
+autofront.add(nap, join=True, title='low')
+autofront.add(nap, join=True, title='high', priority=5)
+autofront.add(nap, join=True, title='capped', max_concurrent=1)
+
+def wait_for_runs(client, run_urls):
+    """ Poll runs until they are all over | Flask client, [str] --> [dict] """
+    while True:
+        run_infos = [json.loads(client.get(run_url).data) for run_url in run_urls]
+        if all([run_info['state'] not in ['queued', 'running']
+                for run_info in run_infos]):
+            return run_infos
+        time.sleep(0.1)
+
+if __name__ == '__main__':
+    client = autofront.create_wsgi_app().test_client()
+    run_urls = [client.post('/', data={title:''}).location.rsplit('/', 1)[0]
+                for title in CLICKS] #Run page --> run status
+    print(json.loads(client.get('/queue').data))
+    run_infos = wait_for_runs(client, run_urls)
+    failed = []
+    for run_info in sorted(run_infos, key=lambda run_info: run_info['waited']):
+        print('{0:8} {1:10} waited {2:.2f} seconds'.format(run_info['title'],
+                                                           run_info['state'],
+                                                           run_info['waited']))
+    if run_infos[-1]['state'] != 'rejected':
+        failed.append('run above the queue size was not rejected')
+    started = run_infos[2:-1] #Runs that waited in the queue
+    high_wait = [run_info['waited'] for run_info in started
+                 if run_info['title'] == 'high'][0]
+    if any([run_info['waited'] < high_wait for run_info in started]):
+        failed.append('a run started before the high priority run')
+    capped = sorted([run_info['waited'] for run_info in run_infos
+                     if run_info['title'] == 'capped'])
+    if any([current - previous < NAP for previous, current in zip(capped, capped[1:])]):
+        failed.append('capped runs ran at the same time')
+    print(autofront.get_queue_stats())
+    for message in failed:
+        print('FAILED: {}'.format(message))
+    if failed:
+        sys.exit(1)
+    print('All checks passed')
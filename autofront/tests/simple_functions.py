@@ -3,6 +3,7 @@
 All these functions are imported by autotest.py and used to test
 the package.
 """
+from typing import Optional
 
 def bugged_function():
     """ Test function to test exception management | str --> Exception """
@@ -99,6 +100,22 @@ def return_value_types_args(*args, **kwargs):
     """
     return [args, kwargs]
 
+def signature_types(arg1: int, arg2: list, kwarg1: dict = None, kwarg2: float = 0.0):
+    """ Test function for live args converted with type hints
+
+    Copy paste following to test:
+    3, [a, b], kwarg1 = {a : b}, kwarg2 = 4.5
+    """
+    return [arg1, arg2, kwarg1, kwarg2]
+
+def signature_optional(arg1: Optional[int], kwarg1: Optional[tuple] = ()):
+    """ Test function for live args converted with Optional type hints
+
+    Copy paste following to test, should return [None, None]:
+    None, kwarg1 = None
+    """
+    return [arg1, kwarg1]
+
 def detect_function():
     print('This is a function')
     
@@ -0,0 +1,56 @@
+""" Test when the main page streams print calls
+
+This module opens the main page through the Flask test client with and
+without a run in the background. The main page must only open its display
+stream while runs are queued or running, and the stream must end once they
+are over, so pages left open don't keep a server thread busy.
+
+Run it directly from the tests directory::
+    python stream_test.py
+
+It prints each check and exits with an error if one of them fails.
+"""
+import sys
+import time
+import autofront
+
+NAP = 1 #Running time of the background run in seconds
+
+def nap():
+    time.sleep(NAP)
+    print('Napped in the background')
+
+autofront.initialize()
+autofront.add(nap, join=False, title='nap')
+
+def read_stream(client):
+    """ Events of the unkeyed display stream until it ends | Flask client --> str """
+    response = client.get('/stream', buffered=False)
+    events = ''
+    for chunk in response.response:
+        events += chunk.decode() if isinstance(chunk, bytes) else chunk
+        if 'event: end' in events:
+            break
+    response.close()
+    return events
+
+if __name__ == '__main__':
+    client = autofront.create_wsgi_app().test_client()
+    failed = []
+    if 'EventSource' in client.get('/').data.decode():
+        failed.append('main page streams with no run in progress')
+    client.post('/', data={'nap':''})
+    if 'EventSource' not in client.get('/').data.decode():
+        failed.append('main page does not stream during a background run')
+    start_time = time.time()
+    events = read_stream(client)
+    print('Stream ended after {:.2f} seconds'.format(time.time() - start_time))
+    if 'Napped in the background' not in events:
+        failed.append('print calls of the background run were not streamed')
+    if 'event: end' not in events:
+        failed.append('stream did not end after the run')
+    for message in failed:
+        print('FAILED: {}'.format(message))
+    if failed:
+        sys.exit(1)
+    print('All checks passed')
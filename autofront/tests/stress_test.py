@@ -0,0 +1,130 @@
+""" Stress test for concurrent requests
+
+This module starts autofront with autofront.serve, then sends many POST
+requests at once from separate threads, like several browsers clicking
+routes at the same time. Every run must finish with its own print calls,
+every input session must get its own answers, and no run or input session
+may be left in progress once they are all over.
+
+Run it directly from the tests directory::
+    python stress_test.py
+
+It prints the number of requests, their total time and the final state,
+and exits with an error if a check fails.
+"""
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import autofront
+from simple_functions import foo, input_function
+
+PORT = 5099
+
+RUNS = 50 #Concurrent POST requests to a function route
+
+INPUT_SESSIONS = 10 #Concurrent input sessions answered with different inputs
+
+autofront.initialize(pool_size=4, worker_limit=0)
+autofront.add(foo, join=True)
+autofront.add(input_function)
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """ Return redirects instead of following them """
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+opener = urllib.request.build_opener(NoRedirect)
+
+def request(path, data=None):
+    """ Send a GET or POST request | str, dict --> str, str
+
+    Returns the redirect location, None if not redirected, and the page.
+    """
+    if data is not None:
+        data = urllib.parse.urlencode(data).encode()
+    try:
+        response = opener.open('http://127.0.0.1:{0}{1}'.format(PORT, path), data)
+    except urllib.error.HTTPError as error: #Redirects end up here
+        return error.headers.get('Location'), ''
+    return None, response.read().decode()
+
+def wait_for_run(location):
+    """ Poll a run until it is over | str --> dict """
+    run_url = location.rsplit('/', 1)[0] #Run page --> run status
+    while True:
+        run_info = json.loads(request(run_url)[1])
+        if run_info['state'] not in ['queued', 'running']:
+            return run_info
+        time.sleep(0.05)
+
+def run_function(results):
+    """ Run the foo route and keep its final state and output | list --> None """
+    location, page = request('/', {'foo':''})
+    run_info = wait_for_run(location)
+    results.append((run_info['state'], ''.join(run_info['output'])))
+
+def run_input_session(index, results):
+    """ Answer both input calls of input_function | int, list --> None """
+    location, page = request('/', {'input_function':''})
+    request(location) #Starts the worker, waits for the first prompt
+    answers = ['first {}'.format(index), 'second {}'.format(index)]
+    for answer in answers:
+        request(location, {'Input':answer})
+    request(location) #Ends the session
+    results.append(answers)
+
+def start_threads(target, count, *args):
+    """ Start count threads at once and wait for all of them | func --> None """
+    threads = [threading.Thread(target=target, args=args) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+if __name__ == '__main__':
+    server = threading.Thread(target=autofront.serve, kwargs={'port':PORT}, daemon=True)
+    server.start()
+    time.sleep(2) #Let the server and worker pool start
+    failed = []
+    start_time = time.time()
+    run_results = []
+    start_threads(run_function, RUNS, run_results)
+    print('{0} runs in {1:.2f} seconds'.format(RUNS, time.time() - start_time))
+    if len(run_results) != RUNS:
+        failed.append('{} runs never finished'.format(RUNS - len(run_results)))
+    for run_state, output in run_results:
+        if run_state != 'finished' or 'bar' not in output:
+            failed.append('run ended as {0} with output {1!r}'.format(run_state, output))
+    start_time = time.time()
+    input_results = []
+    sessions = [threading.Thread(target=run_input_session, args=(index, input_results))
+                for index in range(INPUT_SESSIONS)]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+    print('{0} input sessions in {1:.2f} seconds'.format(INPUT_SESSIONS,
+                                                         time.time() - start_time))
+    location, page = request('/')
+    for answers in input_results:
+        expected = 'They said &#34;{0}&#34; and &#34;{1}&#34;'.format(*answers)
+        if expected not in page:
+            failed.append('answers {} were not displayed'.format(answers))
+    state = autofront.config.state
+    deadline = time.time() + 5 #Let the reaper see the last workers end
+    while (state.run_status or state.worker_records) and time.time() < deadline:
+        time.sleep(0.1)
+    print('Final state: {}'.format(state))
+    if state.run_status:
+        failed.append('runs still in progress: {}'.format(state.run_status))
+    if state.worker_records:
+        failed.append('workers still running: {}'.format(state.worker_records))
+    for message in failed:
+        print('FAILED: {}'.format(message))
+    if failed:
+        sys.exit(1)
+    print('All checks passed')
@@ -5,19 +5,28 @@ This module contains various functions that help create routes
 and process user input for live arguments. It calls on the parse module
 to parse arguments with type indications.
 
+It also manages the display. Print calls made in workers are sent to the main
+process through the display pipe, where they are kept in a bounded buffer
+for each route until the browser shows them.
+
+Worker processes import this module, so modules only needed by the server
+or by scripts are imported inside the functions using them.
+
 """
 
 import atexit
-import contextlib
+import collections
 import functools
+import hashlib
+import heapq
+import itertools
 import multiprocessing
+import multiprocessing.connection
+import os
 import pathlib
-import pprint
-import shutil
-import socket
-import subprocess
-from autofront.config import config, status
-from autofront.parse import parse_command_line_args, parse_args, parse_type_args
+import sys
+import threading
+from autofront.config import config, state
 
 def create_local_dir():
     """ Creates local directory if it doesn't exist | None --> None """
@@ -41,6 +50,17 @@ def local_write(filename, string):
     with open(get_local_path().joinpath(filename), 'w') as file_object:
         file_object.write(string)
 
+python_command = None #Command used to run scripts, set by set_python_command
+
+def get_cache_path():
+    """ Get path of the cache kept between runs | None --> Path
+
+    Unlike the local directory, this is not deleted on program exit.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    cache_home = cache_home or pathlib.Path.home().joinpath('.cache')
+    return pathlib.Path(cache_home).joinpath('autofront')
+
 def get_shell_python_version(command='python -V'):
     """ Get version of Python running in shell | None --> tuple
 
@@ -50,62 +70,72 @@ def get_shell_python_version(command='python -V'):
     Minor version is not used at present but is included in case it is needed
     in future versions.
     """
+    import subprocess
     result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, check=True,
                             stderr=subprocess.STDOUT, universal_newlines=True)
-    version_string = result.stdout
-    major_version_index = version_string.find(' ') + 1
-    major_version = int(version_string[major_version_index])
-    minor_version_index = version_string.find('.') + 1
-    minor_version = int(version_string[minor_version_index])
-    micro_version_index = version_string.rfind('.') +1
-    end_index = len(version_string)
-    micro_version = int(version_string[micro_version_index:end_index])
-    return tuple([major_version, minor_version, micro_version])
-
-def set_python_command():
-    """ Set python command to run scripts in the shell | None --> None
-
-    Finds the correct command to run Python 3.
+    version_string = result.stdout.split()[1] #'Python 3.8.2' --> '3.8.2'
+    return tuple([int(number) for number in version_string.split('.')[:3]])
+
+def find_shell_python_command():
+    """ Find the command running Python 3 in the shell | None --> str
+
     Tests "python" first, then "python3" if "python" runs Python 2.
+    The result is cached on disk for the current PATH, so the shell is only
+    tested again if PATH changes.
     """
+    import json
+    import subprocess
+    cache_file = get_cache_path().joinpath('python_commands.json')
+    path = os.environ.get('PATH', '')
+    try:
+        with open(cache_file, 'r') as file_object:
+            cached_commands = json.load(file_object)
+    except (OSError, ValueError):
+        cached_commands = {}
+    if path in cached_commands:
+        return cached_commands[path]
     print('Testing "python" command')
-    version = get_shell_python_version()
-    major_version = version[0]
-    minor_version = version[1]
-    micro_version = version[2]
-    if major_version == 2:
-        print('Testing "python3" command')
-        try:
+    command = 'python'
+    try:
+        version = get_shell_python_version()
+        if version[0] == 2:
+            print('Testing "python3" command')
             version = get_shell_python_version(command='python3 -V')
-            major_version = version[0]
-            minor_version = version[1]
-            micro_version = version[2]
-            if major_version == 3:
-                print('Scripts will be run with "python3" command')
-                print('Python version is {0}.{1}.{2}'.format(major_version,
-                                                             minor_version,
-                                                             micro_version))
-                local_write('python_command.txt', 'python3')
-            else:
-                print('Error identifying correct python command to run scripts.')
-                print("Defaulting to 'python'")
-        except IndexError:
+            command = 'python3'
+        print('Shell Python version is {0}.{1}.{2}'.format(*version))
+        if version[0] == 2:
             print('Warning: Your script environment is in Python 2.')
-            print('Scripts will be run using the Python 2 interpreter')
             print('This will probably fail due to incompatibilities with autofront')
-            print('Shell Python version is {0}.{1}.{2}'.format(major_version,
-                                                               minor_version,
-                                                               micro_version))
-    else:
-        print('Scripts will be run with "python" command')
-        print('Python version is {0}.{1}.{2}'.format(major_version,
-                                                     minor_version,
-                                                     micro_version))
-        local_write('python_command.txt', 'python')
+    except (subprocess.CalledProcessError, IndexError, ValueError):
+        print('Error identifying correct python command to run scripts.')
+        print("Defaulting to 'python'")
+        return command
+    cached_commands[path] = command
+    try:
+        get_cache_path().mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w') as file_object:
+            json.dump(cached_commands, file_object)
+    except OSError: #Cache is only an optimization
+        pass
+    return command
+
+def set_python_command(command=None):
+    """ Set python command to run scripts | str --> None
+
+    Uses the command kwarg if specified (see autofront.initialize), otherwise
+    the interpreter running autofront. The shell is only tested if the
+    interpreter path is unknown, which can happen when Python is embedded.
+    """
+    global python_command
+    if not command:
+        command = sys.executable or find_shell_python_command()
+    python_command = command
+    config['python_command'] = command
+    print('Scripts will be run with "{}"'.format(command))
 
 def get_python_command():
     """ Get correct version of python command | None --> str """
-    return local_read('python_command.txt')
+    return python_command or config['python_command'] or sys.executable
 
 def set_main_process_pid():
     """ Store main process pid | None --> None
@@ -162,6 +192,8 @@ def clear_local_files():
     start up a python shell, import autofront and run::
         autofront.utilities.clear_local_files()
     """
+    import shutil
+    local_scripts.clear()
     for path in get_local_path().iterdir():
         print('Deleting: ' + str(path))
         if path.is_file():
@@ -180,20 +212,6 @@ def cleanup():
         print('Cleaning up environment')
         clear_local_files()
 
-def insert_lines(readlines_list, index_newline_list):
-    """ Insert lines in list of file lines. | [str], [(int, [str])] --> [str]
-
-    Takes file.readlines() output list and a list of tuples of line index
-    and corresponding list of lines to insert.
-    """
-    for tup in index_newline_list:
-        index = tup[0]
-        lines = tup[1]
-        for line in lines:
-            readlines_list.insert(index, line)
-            index += 1
-    return readlines_list
-
 def get_local_filepath(filepath):
     """ Change filepath to local directory, used to copy a file | str -->  Path
 
@@ -205,40 +223,243 @@ def get_local_filepath(filepath):
     new_path = get_local_path().joinpath(source_name)
     return new_path
 
-def clear_display():
-    """ Clear display text file | None --> None
+def get_local_script_path(source_path):
+    """ Path of the local copy of a script | Path --> Path
 
-    'display.txt' file is where all print calls are redirected
-    for display in browser.
+    Every source script gets its own directory named after a short hash of its
+    resolved path, so scripts with the same name in different directories
+    don't share a copy. The copy keeps the name of the script.
+    """
+    path_hash = hashlib.sha1(str(source_path).encode()).hexdigest()[:12]
+    return get_local_path().joinpath(path_hash, source_path.name)
+
+display_reader = None #Main process end of the display pipe
+display_channel = None #Worker end of the display pipe and its lock
+display_key = None #Title of the route running in this worker
+display_buffers = {} #Route title --> deque of (index, text) - main process only
+display_history = {} #Run id --> deque of text, kept after the display is cleared
+display_index = itertools.count() #Keeps print calls in order across routes
+display_log = collections.deque() #(index, key, text) of recent print calls, for streaming
+display_lock = threading.RLock()
+display_condition = threading.Condition(display_lock) #Notified on every print call
+display_listeners = [] #Functions called on every print call, see add_display_listener
+
+def create_display_channel():
+    """ Create display pipe and start draining it | None --> None
+
+    Called once in the main process by autofront.initialize. Workers receive
+    the channel when they are created (see multi.create_process).
+    """
+    global display_reader, display_channel, display_log
+    display_reader, display_writer = multiprocessing.Pipe(duplex=False)
+    display_log = collections.deque(maxlen=config['display_size'])
+    display_channel = (display_writer, multiprocessing.Lock())
+    pump = threading.Thread(target=pump_display, name='display_pump', daemon=True)
+    pump.start()
+
+def set_display_channel(channel, key):
+    """ Set display channel and route title in a worker | tuple, str --> None """
+    global display_channel, display_key
+    display_channel = channel
+    display_key = key
+
+def pump_display():
+    """ Drain display pipe as print calls arrive | None --> None """
+    while True:
+        try:
+            multiprocessing.connection.wait([display_reader])
+            drain_display()
+        except (EOFError, OSError):
+            break
+
+def drain_display():
+    """ Move print calls waiting in the display pipe to buffers | None --> None """
+    with display_lock:
+        while display_reader.poll():
+            key, text = display_reader.recv()
+            buffer_display(key, text)
+
+def buffer_display(key, text):
+    """ Add text to a route's display buffer | str, str --> None
+
+    A text value of None clears the route's buffer.
+    """
+    with display_lock:
+        if text is None:
+            display_buffers.pop(key, None)
+            return
+        if key not in display_buffers:
+            display_buffers[key] = collections.deque(maxlen=config['display_size'])
+        index = next(display_index)
+        display_buffers[key].append((index, text))
+        if key in display_history:
+            display_history[key].append(text)
+        display_log.append((index, key, text))
+        display_condition.notify_all()
+        for listener in display_listeners:
+            listener()
+
+def track_display(key):
+    """ Keep print calls for a run even after the display is cleared | str --> None """
+    with display_lock:
+        display_history[key] = collections.deque(maxlen=config['display_size'])
+
+def forget_display(key):
+    """ Delete print calls kept for a run | str --> None """
+    with display_lock:
+        display_history.pop(key, None)
+        display_buffers.pop(key, None)
+
+def add_display_listener(listener):
+    """ Call a function on every print call | func --> None
+
+    Used by the ASGI server to wake up its streams without a waiting thread.
+    The listener is called while holding display_lock, so it must return
+    right away.
+    """
+    with display_lock:
+        display_listeners.append(listener)
+
+def remove_display_listener(listener):
+    """ Stop calling a function added with add_display_listener | func --> None """
+    with display_lock:
+        display_listeners.remove(listener)
+
+def get_display_index():
+    """ Get index of the latest print call, -1 if none | None --> int """
+    with display_lock:
+        drain_display()
+        if display_log:
+            return display_log[-1][0]
+        return -1
+
+def wait_for_display(since, key=None, timeout=None):
+    """ Wait for print calls newer than an index | int, str --> [(int, str, str)]
+
+    Returns (index, key, text) tuples, oldest first, as soon as there is at
+    least one, or an empty list if timeout is reached first. Use the key kwarg
+    to only get the print calls of one run or input session.
+
+    Print calls stay in the log even after the display is cleared, so
+    streams don't lose lines when the main page is displayed.
+    """
+    entries = []
+    def get_entries():
+        drain_display()
+        entries[:] = [entry for entry in display_log
+                      if entry[0] > since and (not key or entry[1] == key)]
+        return entries
+    with display_condition:
+        display_condition.wait_for(get_entries, timeout)
+    return entries
+
+def get_display_history(key):
+    """ Get all print calls kept for a run | str --> [str] """
+    with display_lock:
+        drain_display()
+        display = ''.join(display_history.get(key, []))
+    return display.split('\n')
+
+def get_display_output(key):
+    """ Get all print calls kept for a run as one string | str --> str
+
+    Returns None if the oldest print calls were dropped (see config['display_size']).
+    """
+    with display_lock:
+        drain_display()
+        history = display_history.get(key)
+        if history is None or len(history) == history.maxlen:
+            return None
+        return ''.join(history)
+
+def write_display(text, key=None):
+    """ Send text to the display | str --> None
+
+    In the main process, the text goes straight to the display buffers.
+    In a worker, it's sent through the display pipe. In a script subprocess,
+    it's written to stdout, which the worker sends on to the display.
+    """
+    if display_reader is not None:
+        buffer_display(key or display_key, text)
+    elif display_channel is not None:
+        display_writer, lock = display_channel
+        with lock:
+            display_writer.send((display_key, text))
+    elif text is not None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+def clear_display(key=None):
+    """ Clear display | str --> None
+
+    Use the key kwarg to only clear the print calls of one route or input
+    session. In a worker, only clears the print calls of the route it's running.
+    Without it, the print calls of input sessions and of runs still waiting
+    for a worker are kept, since another request is handling them.
     """
     print('Clearing display')
-    if status['request_received'] and not status['request_completed']:
-        pass
+    if display_reader is None:
+        write_display(None)
+    elif key:
+        buffer_display(key, None)
     else:
-        with open(get_local_path().joinpath('display.txt'), 'w'):
-            pass
+        private_keys = state.get_private_keys() #Before display_lock, see get_display
+        with display_lock:
+            for buffer_key in list(display_buffers):
+                if buffer_key not in private_keys:
+                    del display_buffers[buffer_key]
+
+def get_display(key=None):
+    """ Get all print calls sent to the display | str --> [str]
+
+    Use the key kwarg to only get the print calls of one route or input session.
+    Without it, input sessions and runs still waiting for a worker are left out.
+    Only available in the main process, the print calls are kept there.
+    Raises RuntimeError in a worker, for example in a route function.
+    """
+    if display_reader is None:
+        raise RuntimeError('get_display only works in the server process, '
+                           'not in a route running in a worker')
+    #state.lock is taken before display_lock everywhere else, never after it
+    private_keys = set() if key else state.get_private_keys()
+    with display_lock:
+        drain_display()
+        if key:
+            buffers = [display_buffers.get(key, [])]
+        else:
+            buffers = [buffer for buffer_key, buffer in display_buffers.items()
+                       if buffer_key not in private_keys]
+        entries = heapq.merge(*buffers)
+        display = ''.join([text for index, text in entries])
+    return display.split('\n')
+
+resource_limits = None #Limits applied by the worker, set by multi.apply_limits
 
-def get_display():
-    """ Get info from display text file | None --> str
+def get_exceeded_limit(error):
+    """ Resource limit that caused an exception, None if any | Exception --> str
 
-    'display.txt' file is where all print calls are redirected
-    for display in browser.
+    Always None unless the worker runs a route with resource limits. Memory
+    errors in script subprocesses can't be told apart from other errors.
     """
-    try:
-        with open(get_local_path().joinpath('display.txt'), 'r') as filepath:
-            display = filepath.read()
-            display = display.split('\n')
-        return display
-    except FileNotFoundError:
-        with open(get_local_path().joinpath('display.txt'), 'w') as filepath:
-            return ''
+    if not resource_limits:
+        return None
+    import errno
+    import signal
+    import subprocess
+    if isinstance(error, MemoryError):
+        return 'max_memory'
+    if isinstance(error, OSError) and error.errno == errno.EMFILE:
+        return 'max_open_files'
+    if (isinstance(error, subprocess.CalledProcessError) and
+        error.returncode == -getattr(signal, 'SIGXCPU', 0)): #Script subprocess
+        return 'max_cpu_seconds'
+    return None
 
 def print_exception(e):
     """ Used by exception_manager to print to browser | None --> None"""
-    clear_display()
-    with open(get_local_path().joinpath('display.txt'), 'w') as out:
-        with contextlib.redirect_stdout(out):
-            print(e.__class__.__name__ + ': ' + e.args[0])
+    if display_reader is None: #Only replace the print calls of the worker's route
+        clear_display()
+    write_display(e.__class__.__name__ + ': ' + e.args[0] + '\n')
 
 def exception_manager(func):
     """ Decorator to display exceptions in the browser | func --> func
@@ -252,6 +473,8 @@ def exception_manager(func):
             try:
                 wrapped_func = func(*args, **kwargs)
             except Exception as e:
+                if get_exceeded_limit(e): #Reported by the main process instead
+                    raise
                 wrapped_func = None
                 print_exception(e)
         else:
@@ -260,7 +483,7 @@ def exception_manager(func):
     return wrapper
 
 def web_print(*args, file=None, end='\n', sep=' ', flush='Unsupported'):
-    """ Replaces the built-in print function to write to file | str --> None
+    """ Replaces the built-in print function to write to display | str --> None
 
     Ignores the flush kwarg.
     See builtin print function docs for explanation of the sep and end kwargs.
@@ -272,16 +495,17 @@ def web_print(*args, file=None, end='\n', sep=' ', flush='Unsupported'):
             file.write(sep)
         file.write(end)
     else:
-        with open(get_local_path().joinpath('display.txt'), 'a') as display_file:
-            for arg in args:
-                display_file.write(str(arg))
-                display_file.write(' ') #NOTE - Extra space after final arg
-            display_file.write(end)
+        text = ''
+        for arg in args:
+            text += str(arg)
+            text += ' ' #NOTE - Extra space after final arg
+        text += end
+        write_display(text)
 
 def redirect_print(func):
     """ Decorator to divert print calls to the browser | func --> func
 
-    Used as a decorator to print to 'display.txt' for display
+    Used as a decorator to print to the display
     in the browser instead of to the console.
     """
     @functools.wraps(func)
@@ -296,24 +520,33 @@ def redirect_print(func):
         return return_value
     return wrapper
 
-@redirect_print
-def print_to_display(string):
-    """ Prints any string to the display text_file | str --> None
+def print_to_display(string, key=None):
+    """ Prints any string to the display | str --> None
 
-    'display.txt' file is used to display text in the browser.
+    In the main process, use the key kwarg to print to a specific run's display.
+    The main process writes to the display directly, since replacing the builtin
+    print function there would also divert the print calls of other threads.
     """
+    if key or display_reader is not None:
+        write_display(str(string) + '\n', key=key)
+    else:
+        redirected_print(string)
+
+@redirect_print
+def redirected_print(string):
+    """ Print in a worker with the builtin print function replaced | str --> None """
     print(string)
 
 def print_return_value(return_value):
-    """ Prints the return value of a function to display file | any --> None
-
-    'display.txt' file is used to display text in the browser.
-    """
+    """ Prints the return value of a function to display | any --> None """
     if return_value:
         return_string = str(return_value)
         intro = 'Return value: '
         print_to_display(intro + return_string)
 
+local_scripts = {} #Resolved source path --> (mtime, size) of its local copy
+local_scripts_lock = threading.Lock()
+
 def create_local_script(filepath):
     """ Create local copy of a script, return the new filepath | str or Path --> Path
 
@@ -322,48 +555,135 @@ def create_local_script(filepath):
     despite now being run from local directory
     - Adds original script path to sys.path to ensure imports still work
     - Imports web_input and web_print to replace regular input and print calls
-    """
-    new_path = get_local_filepath(filepath)
-    source_path = pathlib.Path(filepath)
-    source_directory = source_path.parent
-    SCRIPT_INSERT = ['import os',
-                     '\n',
-                     'import sys',
-                     '\n'
-                     'from autofront.utilities import web_print',
-                     '\n',
-                     'from autofront.input_utilities import web_input, write_prompt',
-                     '\n',
-                     '__builtins__.input = web_input',
-                     '\n',
-                     '__builtins__.print = web_print',
-                     '\n',
-                     'os.chdir(r"' + str(source_directory.resolve()) + '")',
-                     '\n',
-                     'sys.path.insert(0, r"' + str(source_directory.resolve()) + '")',
-                     '\n'
-                     ]
-    with open(source_path, 'r') as source_script:
-        contents = source_script.readlines()
-    with open(new_path, 'w') as new_script:
-        new_content = insert_lines(contents, [(0, SCRIPT_INSERT)])
-        new_script.writelines(new_content)
-    return new_path
 
-def wrap_script(script_path, *args):
+    The copy is only written again if the source script has changed since the
+    last call, based on its modification time and size.
+    """
+    source_path = pathlib.Path(filepath).resolve()
+    new_path = get_local_script_path(source_path)
+    with local_scripts_lock: #Two clicks could otherwise write the same copy
+        source_stat = source_path.stat()
+        source_key = (source_stat.st_mtime_ns, source_stat.st_size)
+        if local_scripts.get(str(source_path)) == source_key and new_path.exists():
+            return new_path
+        new_path.parent.mkdir(exist_ok=True)
+        source_directory = source_path.parent
+        SCRIPT_INSERT = ['import os',
+                         '\n',
+                         'import sys',
+                         '\n'
+                         'from autofront.utilities import web_print',
+                         '\n',
+                         'from autofront.input_utilities import web_input, write_prompt',
+                         '\n',
+                         '__builtins__.input = web_input',
+                         '\n',
+                         '__builtins__.print = web_print',
+                         '\n',
+                         'os.chdir(r"' + str(source_directory.resolve()) + '")',
+                         '\n',
+                         'sys.path.insert(0, r"' + str(source_directory.resolve()) + '")',
+                         '\n'
+                         ]
+        with open(source_path, 'r') as source_script:
+            contents = source_script.read()
+        temp_path = new_path.with_name(new_path.name + '.tmp')
+        with open(temp_path, 'w') as new_script:
+            new_script.write(''.join(SCRIPT_INSERT))
+            new_script.write(contents)
+        os.replace(temp_path, new_path) #Workers never see a half written copy
+        local_scripts[str(source_path)] = source_key
+        return new_path
+
+def wrap_script(script_path, *args, relay=None, python_command=None):
     """ Create function to run script | Path, [str] --> func
 
     Returns a function that will run a script using the subprocess module.
+    Each line the script prints is sent to the display as soon as it's printed.
+
+    For scripts with input calls, 'relay' is called with every line printed
+    and the script itself, and returns True if the line was an input prompt.
+
+    Workers don't share the main process config, so the main process passes
+    its python command with the python_command kwarg.
     """
+    import subprocess
     command_list = list(args)
     command_list.insert(0, str(script_path.resolve()))
-    command_list.insert(0, get_python_command())
+    command_list.insert(0, python_command or get_python_command())
     def new_function():
-        with open(get_local_path().joinpath('display.txt'), 'a') as out:
-            subprocess.run(command_list, stdout=out, stderr=out, check=True)
+        environment = dict(os.environ, PYTHONUNBUFFERED='1')
+        stdin = subprocess.PIPE if relay else None
+        with subprocess.Popen(command_list, stdin=stdin, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, env=environment,
+                              universal_newlines=True) as script:
+            for line in script.stdout:
+                if relay and relay(line, script):
+                    continue
+                write_display(line)
+        if script.returncode:
+            raise subprocess.CalledProcessError(script.returncode, command_list)
     new_function.__name__ = script_path.name
     return new_function
 
+def wrap_script_in_process(script_path, *args, input_function=None):
+    """ Create function to run script in the current process | Path, [str] --> func
+
+    Returns a function that runs a script with runpy instead of a new Python
+    process, which avoids starting a new interpreter for every call. The script
+    runs with the same changes create_local_script makes to script copies:
+    sys.argv, working directory and sys.path are set as if it was run from its
+    own folder, and print calls go to the display. Use the input_function kwarg
+    to replace input calls as well. Everything is restored once the script ends.
+
+    Modules imported by the script stay imported in the worker, so they are
+    not reloaded when the script runs again in the same pool worker.
+    """
+    import runpy
+    import subprocess
+    import traceback
+    source_path = pathlib.Path(script_path).resolve()
+    source_directory = str(source_path.parent)
+    command_list = [str(source_path)] + [str(arg) for arg in args]
+    def new_function():
+        bkup_argv = sys.argv
+        bkup_path = sys.path.copy()
+        bkup_cwd = os.getcwd()
+        bkup_print = __builtins__['print']
+        bkup_input = __builtins__['input']
+        sys.argv = command_list.copy()
+        sys.path.insert(0, source_directory)
+        os.chdir(source_directory)
+        __builtins__['print'] = web_print
+        if input_function:
+            __builtins__['input'] = input_function
+        try:
+            runpy.run_path(str(source_path), run_name='__main__')
+        except SystemExit as e: #Same as a script exiting in a subprocess
+            if e.code not in [None, 0]:
+                if not isinstance(e.code, int):
+                    write_display(str(e.code) + '\n')
+                raise subprocess.CalledProcessError(1, command_list)
+        except Exception as e: #Display traceback like a script subprocess would
+            if get_exceeded_limit(e):
+                raise
+            script_traceback = e.__traceback__
+            while (script_traceback and
+                   script_traceback.tb_frame.f_code.co_filename != str(source_path)):
+                script_traceback = script_traceback.tb_next #Skip runpy frames
+            lines = traceback.format_exception(type(e), e,
+                                               script_traceback or e.__traceback__)
+            write_display(''.join(lines))
+            raise subprocess.CalledProcessError(1, command_list)
+        finally:
+            sys.argv = bkup_argv
+            sys.path[:] = bkup_path
+            os.chdir(bkup_cwd)
+            __builtins__['print'] = bkup_print
+            __builtins__['input'] = bkup_input
+    new_function.__name__ = source_path.name
+    return new_function
+
 def add_args_to_title(route_title, arg_list, script=False):
     """ Add fixed args to function name for display in browser | str, [str] --> str """
     title = route_title
@@ -385,69 +705,40 @@ def remove_args(route_title):
 
 def title_exists(title):
     """ Check if a route with this title already exists | str --> Bool """
-    route_dict = [route_dict for route_dict in config['route_dicts']
-                  if route_dict['title'] == title]
-    if route_dict:
-        return True
-    return False
-
-def get_route_dict(title):
-    """ Get specific route dict from route_dicts | str --> dict """
-    route_dict = [route_dict for route_dict in config['route_dicts']
-                  if route_dict['title'] == title]
-    if len(route_dict) > 1: #Shouldn't happen, here for safety
-        raise Exception('Cannot use same title twice')
+    return title in config['route_index']
+
+def get_route(title):
+    """ Get specific route from route_index | str --> Route """
     try:
-        route_dict = route_dict[0]
-    except IndexError:
+        return config['route_index'][title]
+    except KeyError:
         print(title)
-        print(str(route_dict))
-        raise IndexError("Couldn't find route dict with this title")
-    return route_dict
+        raise IndexError("Couldn't find route with this title")
 
 def get_fixed_args(title):
-    """ Get fixed args for a function from route_dicts | str --> [[str],[str]]"""
-    route_dict = get_route_dict(title)
-    all_fixed_args = []
-    fixed_args = route_dict['args'].copy()
-    fixed_kwargs = route_dict['kwargs'].copy()
-    all_fixed_args = [fixed_args, fixed_kwargs]
-    return all_fixed_args
+    """ Get fixed args for a function from routes | str --> [[str],[str]]"""
+    route = get_route(title)
+    return [route.args.copy(), route.kwargs.copy()]
 
 def get_function(title):
-    """ Get function from route_dicts | str --> func"""
-    route_dict = get_route_dict(title)
-    function = route_dict['function']
-    return function
+    """ Get function from routes | str --> func"""
+    return get_route(title).function
 
 def get_script_path(title):
-    """ Get script_path from route_dicts | str --> str"""
-    route_dict = get_route_dict(title)
-    script_path = route_dict['script_path']
-    return script_path
+    """ Get script_path from routes | str --> str"""
+    return get_route(title).script_path
 
 def is_script(title):
     """ Check if route is for a script | str --> bool"""
-    route_dict = get_route_dict(title)
-    bool_value = route_dict['script']
-    return bool_value
+    return get_route(title).script
 
 def is_live(title):
     """ Check if script or function needs live arguments | str --> bool """
-    route_dict = get_route_dict(title)
-    bool_value = route_dict['live']
-    return bool_value
-
-def has_key(title, key):
-    """ Check if route dict has a specific key | str, str --> bool """
-    route_dict = get_route_dict(title)
-    return key in route_dict
+    return get_route(title).live
 
 def needs_input(title):
     """ Check if script or function needs user input | str --> bool """
-    route_dict = get_route_dict(title)
-    bool_value = route_dict['input']
-    return bool_value
+    return get_route(title).input
 
 def wait_to_join(title):
     """ Check if script or function needs to keep running | str --> bool
@@ -455,30 +746,37 @@ def wait_to_join(title):
     This is used for functions or scripts that are meant to keep running
     in background.
     """
-    route_dict = get_route_dict(title)
-    bool_value = route_dict['join']
-    return bool_value
+    return get_route(title).join
 
 def get_timeout(title):
     """ Get timeout value of function or script | str --> bool """
-    route_dict = get_route_dict(title)
-    timeout = route_dict['timeout']
+    timeout = get_route(title).timeout
     if not timeout:
         timeout = config['timeout']
     return timeout
 
 def typed_args(title):
     """ Check if function uses type indications | str --> bool"""
-    route_dict = get_route_dict(title)
-    bool_value = route_dict['typed']
-    return bool_value
+    return get_route(title).typed
 
-def get_live_args(request, script=False, typed=False):
-    """ Get live args input by user | request --> [[str], [str]]"""
+def get_live_args(request, script=False, typed=False, schema=None):
+    """ Get live args input by user | request --> [[str], [str]]
+
+    Use the schema kwarg for routes with typed='signature'
+    (see parse.create_signature_schema).
+    """
+    from autofront.parse import parse_args, parse_command_line_args
+    from autofront.parse import parse_signature_args, parse_type_args
     arg_string = list(request.form.values())[0]
     if script:
         return parse_command_line_args(arg_string)
-    if typed:
+    if schema:
+        try:
+            all_args = parse_signature_args(arg_string, schema)
+        except Exception as e: #Doesn't matter what the exception is.
+            #raise e #Uncomment for testing
+            return ('Parsing Error', e)
+    elif typed:
         try:
             all_args = parse_type_args(arg_string)
         except Exception as e: #Doesn't matter what the exception is.
@@ -492,17 +790,19 @@ def get_live_args(request, script=False, typed=False):
     print(all_args)
     return all_args
 
-def print_route_dicts():
-    """ Print all route dicts with pretty print | None --> None
+def print_routes():
+    """ Print all routes with pretty print | None --> None
 
-    This is used for development purposes to make sure route_dicts
+    This is used for development purposes to make sure routes
     are behaving properly.
     """
-    for route_dict in config['route_dicts']:
-        pprint.pprint(route_dict)
+    import pprint
+    for route in config['routes']:
+        pprint.pprint(route)
 
 def get_local_ip():
     """ Get local ip of machine running autofront | None --> str """
+    import socket
     hostname = socket.gethostname()
     local_ip = socket.gethostbyname(hostname) #For MacOS + Windows
     if local_ip == '127.0.1.1': #For some Linux OS
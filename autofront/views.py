@@ -0,0 +1,309 @@
+""" Flask view functions for autofront
+
+This module contains the pages and endpoints of the autofront server.
+It is imported by autofront.initialize, which creates the Flask app and
+registers the views with register_views. Worker processes never import it,
+so they don't have to load Flask.
+
+functions is the main page displaying all routes and their print calls.
+browser_input gets user input in the browser for routes with input calls.
+run_status, run_view and display_stream let the browser follow a run.
+worker_stats and queue_stats let monitoring tools check the workers and run queue.
+"""
+import json
+import pathlib
+from flask import Response, jsonify, redirect, render_template, request, url_for
+from autofront.config import config, print_config_dict
+from autofront.config import state as server_state
+from autofront.input_utilities import clear_prompt, create_input_session
+from autofront.input_utilities import end_input_session, expect_prompt, get_input_args
+from autofront.input_utilities import get_input_kwargs, get_input_session, get_prompt
+from autofront.input_utilities import set_input_connection, wait_for_prompt
+from autofront.input_utilities import write_input
+from autofront.multi import create_process, get_queue_stats, get_run_info
+from autofront.multi import get_worker_stats, submit_run
+from autofront.parse import SIGNATURE_ERROR_MESSAGE, TYPE_ERROR_MESSAGE
+from autofront.utilities import clear_display, create_local_script
+from autofront.utilities import get_display, get_display_index, get_live_args
+from autofront.utilities import get_route, print_exception, print_routes
+from autofront.utilities import remove_args, wait_for_display
+
+def functions():
+    """ Main page displaying all functions and their print calls """
+    #print_routes() #Uncomment to check routes during development
+    #print_config_dict() #Uncomment to check config dict during devellopment
+    if request.method == 'POST':
+        title = list(request.form.keys())[0] #Corresponds to 'input name' in HTML
+        route = get_route(title) #Only lookup needed for this request
+        join = route.join
+        timeout = route.timeout or config['timeout']
+        args = route.args.copy()
+        if route.script: #Path for scripts
+            script_path = route.script_path
+            if route.live: #For scripts with args input in browser
+                live_args = get_live_args(request, script=True)
+                if live_args:
+                    args += live_args
+            if route.input: #For scripts with input calls
+                run_id = create_input_session(title, args)
+                return redirect(url_for('browser_input', title=title, run_id=run_id))
+            if route.in_process: #Run with runpy, no local copy needed
+                script_path = pathlib.Path(script_path)
+                script_type = 'in_process_script'
+            else:
+                script_path = create_local_script(script_path)
+                script_type = 'script'
+            run_id = submit_run(script_path, *args, type=script_type, join=join,
+                                timeout=timeout, route_title=title,
+                                limits=route.limits, priority=route.priority,
+                                max_concurrent=route.max_concurrent)
+            return redirect_to_run(run_id, join)
+        function = route.function #Path for function calls
+        kwargs = route.kwargs.copy()
+        if route.live: #For functions with args input in browser
+            live_args = get_live_args(request, typed=route.typed, schema=route.schema)
+            if live_args[0] == 'Parsing Error':
+                print_exception(live_args[1])
+                display_index = get_stream_index()
+                if route.schema:
+                    display = get_display() + SIGNATURE_ERROR_MESSAGE
+                else:
+                    display = get_display() + TYPE_ERROR_MESSAGE
+                clear_display()
+                route_dicts = config['routes']
+                top = config['top']
+                return render_template('functions.html', title='functions', top=top,
+                                       display=display, route_dicts=route_dicts,
+                                       display_index=display_index)
+            if live_args[0]:
+                args += live_args[0]
+            kwargs.update(live_args[1])
+        if route.input: #For functions that use input calls
+            run_id = create_input_session(title, args, kwargs=kwargs)
+            return redirect(url_for('browser_input', title=title, run_id=run_id))
+        run_id = submit_run(function, *args, type='function', join=join,
+                            timeout=timeout, route_title=title, limits=route.limits,
+                            priority=route.priority,
+                            max_concurrent=route.max_concurrent, cache=route.cache,
+                            **kwargs)
+        return redirect_to_run(run_id, join)
+    display_index = get_stream_index() #Print calls after this one are streamed
+    display = get_display()
+    clear_display()
+    route_dicts = config['routes']
+    top = config['top']
+    return render_template('functions.html', title='functions', top=top,
+                           display=display, route_dicts=route_dicts,
+                           display_index=display_index)
+
+def get_stream_index():
+    """ Display index to stream the main page from, None if nothing runs | None --> int
+
+    The main page only streams print calls while runs are queued or running,
+    since an open stream keeps a server thread busy under a WSGI server.
+    """
+    if not server_state.has_active_runs():
+        return None
+    return get_display_index()
+
+def redirect_to_run(run_id, join):
+    """ Show the run page while a route runs, unless it runs in background """
+    if join:
+        return redirect(url_for('run_view', run_id=run_id))
+    return redirect(url_for('functions'))
+
+def run_status(run_id):
+    """ State, running time and print calls of a run in JSON format """
+    run_info = get_run_info(run_id)
+    if not run_info:
+        return jsonify({'run_id':run_id, 'state':'unknown'}), 404
+    return jsonify(run_info)
+
+def worker_stats():
+    """ Running workers and counts of reaped workers in JSON format, for monitoring """
+    return jsonify(get_worker_stats())
+
+def queue_stats():
+    """ Queue depth and waiting times of the run queue in JSON format, for monitoring """
+    return jsonify(get_queue_stats())
+
+def run_view(run_id):
+    """ Page shown while waiting for a run to finish
+
+    The page streams the print calls of the run as they happen and returns
+    to the main page when the run is over, where its print calls are
+    displayed as usual.
+    """
+    display_index = get_display_index()
+    run_info = get_run_info(run_id)
+    if not run_info or run_info['state'] not in ['queued', 'running']:
+        return redirect(url_for('functions'))
+    return render_template('run.html', title='run', run=run_info,
+                           display=run_info['output'], display_index=display_index)
+
+def format_event(data, event=None, event_id=None):
+    """ Format a Server-Sent Event | any, str, int --> str """
+    lines = []
+    if event:
+        lines.append('event: {}'.format(event))
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.append('data: {}'.format(json.dumps(data)))
+    return '\n'.join(lines) + '\n\n'
+
+def remove_private_entries(entries):
+    """ Leave out print calls of runs that aren't public yet | list --> list
+
+    Checked after waiting for the display, since the server state lock must
+    not be taken while holding the display lock.
+    """
+    private_keys = server_state.get_private_keys()
+    return [entry for entry in entries if entry[1] not in private_keys]
+
+def display_stream():
+    """ Stream print calls to the browser as Server-Sent Events
+
+    Every print call newer than the 'since' query arg (or the Last-Event-ID
+    header when the browser reconnects) is sent as a 'message' event with
+    the print call index as event id and {'key', 'text'} as JSON data.
+
+    Use the 'key' query arg to only stream the print calls of one run.
+    A 'state' event is then sent when the run state changes and an 'end'
+    event when the run is over, after its last print calls.
+
+    Without a key, an 'end' event is sent once no run is queued or running,
+    so pages left open don't keep a server thread busy.
+    """
+    since = request.headers.get('Last-Event-ID', request.args.get('since', -1))
+    try:
+        since = int(since)
+    except ValueError:
+        since = -1
+    key = request.args.get('key')
+    def stream():
+        last_index = since
+        last_state = None
+        while True:
+            state = None
+            if key:
+                run_info = get_run_info(key)
+                state = run_info['state'] if run_info else 'unknown'
+                if state != last_state:
+                    yield format_event(state, event='state')
+                    last_state = state
+            elif not server_state.has_active_runs(): #Nothing left to stream
+                state = 'idle'
+            ended = state not in [None, 'queued', 'running']
+            timeout = 0 if ended else 1 #Notices run changes and closed pages soon
+            entries = wait_for_display(last_index, key=key, timeout=timeout)
+            if entries:
+                last_index = entries[-1][0]
+            if not key: #Print calls of input sessions stay private, as on the main page
+                entries = remove_private_entries(entries)
+            for index, entry_key, text in entries:
+                yield format_event({'key':entry_key, 'text':text}, event_id=index)
+            if ended:
+                yield format_event(state, event='end')
+                return
+            if not entries:
+                yield ': keep-alive\n\n' #Lets the server notice closed connections
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control':'no-cache', 'X-Accel-Buffering':'no'})
+
+def browser_input(title, run_id):
+    """ Page to get input from user - run multiple times per script or function
+
+    Every call to an input route is a separate input session identified by
+    the run id in the URL, so several users can run input routes at once.
+
+    Step 1: First run when input script or function has been detected.
+            Starts script or function.
+    Step 2: Run as many times as there are input calls - displays prompt
+            and gets input
+    Step 3: Run as many times as there are input calls - sends user input
+            to script or function and waits until it exits or timeouts
+            or there is another input call.
+    Step 4: Run when the function or script has terminated - returns
+            to the main page and displays final results if any.
+    """
+    input_session = get_input_session(run_id)
+    if not input_session: #Session has ended or never existed
+        return redirect(url_for('functions'))
+    with input_session['lock']: #A double click can't start the same session twice
+        if not get_input_session(run_id): #Ended while waiting for the lock
+            return redirect(url_for('functions'))
+        return input_step(input_session, run_id)
+
+def input_step(input_session, run_id):
+    """ Run the current step of an input session, see browser_input """
+    title = input_session['title']
+    route = get_route(title)
+    timeout = route.timeout or config['timeout']
+    display = get_display(key=run_id)
+    #Step 3 - Script or function running - Input received
+    if request.method == 'POST':
+        clear_display(key=run_id)
+        form_data = request.form
+        input_data = form_data['Input']
+        clear_prompt(run_id)
+        write_input(run_id, input_data)
+        prompt_wait(run_id, timeout=timeout)
+        return redirect(url_for('browser_input', title=title, run_id=run_id))
+    prompt = get_prompt(run_id)
+    #STEP 1 - Script or function not running - Launch it, get first prompt
+    if prompt == 'waiting for prompt':
+        clear_prompt(run_id)
+        args = get_input_args(run_id)
+        if route.script: #Script path
+            if route.in_process:
+                script_path = pathlib.Path(route.script_path)
+                script_type = 'in_process_input_script'
+            else:
+                script_path = create_local_script(route.script_path)
+                script_type = 'input_script'
+            print('creating process for {}'.format(remove_args(title)))
+            worker_record = create_process(script_path, *args, type=script_type,
+                                           timeout=timeout, route_title=run_id,
+                                           limits=route.limits)
+        else: #Function path
+            function = route.function
+            kwargs = get_input_kwargs(run_id)
+            print('creating process for {}'.format(remove_args(title)))
+            worker_record = create_process(function, *args, type='input_function',
+                                           timeout=timeout, route_title=run_id,
+                                           limits=route.limits, **kwargs)
+        worker_record.run_id = run_id #Lets multi.cleanup_workers end the session
+        set_input_connection(run_id, worker_record.input_connection)
+        prompt_wait(run_id)
+        return redirect(url_for('browser_input', title=title, run_id=run_id))
+    #STEP 4 - Script or function has finished running - Return to main page
+    if prompt in ['finished', 'timeout reached']:
+        end_input_session(run_id)
+        return redirect(url_for('functions'))
+    #STEP 2 - Script or function running - get input in browser
+    if prompt == 'None':
+        prompt = ''
+    return render_template('web_input.html', title='get_input',
+                           display=display, prompt=prompt)
+
+def prompt_wait(run_id, timeout=0):
+    """ Wait for the next prompt of an input session | str --> None
+
+    Under the ASGI server (see asgi.py), the wait is left to the server so it
+    doesn't keep a thread busy.
+    """
+    if request.environ.get('autofront.asgi'):
+        expect_prompt(run_id, timeout=timeout)
+    else:
+        wait_for_prompt(run_id, timeout=timeout)
+
+def register_views(app):
+    """ Add autofront URLs to a Flask app | Flask --> None """
+    app.add_url_rule('/', 'functions', functions, methods=['GET', 'POST'])
+    app.add_url_rule('/runs/<run_id>', 'run_status', run_status)
+    app.add_url_rule('/runs/<run_id>/view', 'run_view', run_view)
+    app.add_url_rule('/workers', 'worker_stats', worker_stats)
+    app.add_url_rule('/queue', 'queue_stats', queue_stats)
+    app.add_url_rule('/stream', 'display_stream', display_stream)
+    app.add_url_rule('/browser_input/<title>/<run_id>', 'browser_input',
+                     browser_input, methods=['GET', 'POST'])
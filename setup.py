@@ -21,6 +21,7 @@ setup(
     packages = find_packages(),
     include_package_data = True, #To include MANIFEST.in in bdist
     install_requires = ['flask'],
+    extras_require = {'serve': ['waitress'], 'asgi': ['uvicorn']},
     python_requires = '>=3.6',
     classifiers = [
        'Development Status :: 3 - Alpha',